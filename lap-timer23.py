@@ -1,11 +1,54 @@
 
 import pygame
 import sys
+import argparse
 import time
 import random
 import math
+import os
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from gpiozero import Button
 
+# === Command Line ===
+# Parsed before the screen opens, so a misspelled flag stops with a message
+# instead of being ignored
+def fireworks_scale_arg(value):
+    if value == "auto":
+        return value
+    scale = float(value)
+    if not 0 < scale <= 1:
+        raise argparse.ArgumentTypeError(f"{value} is not between 0 and 1")
+    return scale
+
+parser = argparse.ArgumentParser(description="Lap timer with a fireworks finish")
+parser.add_argument("--fps", type=int, default=30,
+                    help="frame rate of the celebration, e.g. 60 on a Pi 5 or 15 on a "
+                         "Pi Zero; the fireworks move at the same speed at any rate")
+parser.add_argument("--stats", action="store_true", help="print fireworks stats once a second")
+parser.add_argument("--seed", type=int, help="repeat the same celebration for this seed")
+parser.add_argument("--renderer", choices=("sprites", "raster", "circles"), default="sprites",
+                    help="how fireworks are drawn (default: sprites)")
+parser.add_argument("--alpha", action="store_true", help="fade fireworks with real alpha")
+parser.add_argument("--workers", type=int, default=1,
+                    help="threads for particle steps and rasterization")
+parser.add_argument("--fireworks-scale", type=fireworks_scale_arg, default=1.0,
+                    help="fraction of the screen size fireworks are drawn at, or 'auto' "
+                         "to let the raster renderer shrink them when frames run long")
+parser.add_argument("--sim-thread", action="store_true",
+                    help="run the celebration on its own thread")
+parser.add_argument("--benchmark", action="store_true", help="run the benchmarks and exit")
+parser.add_argument("--check", action="store_true", help="run the self-checks and exit")
+parser.add_argument("--bake", action="store_true",
+                    help="record the celebration to disk for replay and exit")
+options = parser.parse_args()
+if options.fps < 1:
+    parser.error("--fps must be at least 1")
+
 # === GPIO Setup ===
 start_lap_button = Button(19,bounce_time=0.1)
 
@@ -21,75 +64,781 @@ font_large = pygame.font.SysFont(None, min(screen_width//12, screen_height//12))
 font_medium = pygame.font.SysFont(None, min(screen_width//20, screen_height//20))
 font_small = pygame.font.SysFont(None, min(screen_width//30, screen_height//30))
 clock = pygame.time.Clock()
+target_fps = options.fps
 
 flash_start_time = None
 flash_duration = 5  # seconds
 
+# Print fireworks stats once a second (python lap-timer23.py --stats)
+show_stats = options.stats
+last_stats_time = time.time()
+
+# === Frame-Time Governor ===
+# Watches how long each frame takes to draw and trades fireworks detail for
+# frame rate, so the timer display stays smooth on slower boards
+class FrameGovernor:
+    # Degradation levels: particle count scale, spawn interval scale, trail cap,
+    # fireworks render scale (used with --fireworks-scale=auto). Only the
+    # raster renderer gets faster drawing smaller: bench_render_scale has it
+    # at 18, 18 and 14 ms a frame at scales 1, 0.75 and 0.5, while sprites
+    # go from 15 to 18 and 17 ms, as the blits stay and a smoothscale is added.
+    levels = (
+        (1.0, 1.0, 20, 1.0),
+        (0.75, 1.25, 15, 1.0),
+        (0.5, 1.5, 10, 1.0),
+        (0.35, 2.0, 6, 0.5),
+        (0.25, 3.0, 3, 0.5),
+    )
+    settle_frames = 30  # Frames to wait after a level change before judging it
+
+    def __init__(self, target_fps, enabled=True):
+        self.budget_ms = 1000 / target_fps
+        self.frame_ms = 0.0  # Smoothed time spent per frame, excluding the tick delay
+        self.level = 0
+        self.cooldown = 0
+        self.enabled = enabled
+
+    def record(self, frame_ms):
+        # Returns True when the degradation level changed
+        self.frame_ms += (frame_ms - self.frame_ms) * 0.1
+        if not self.enabled:
+            return False
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return False
+        if self.frame_ms > self.budget_ms * 0.9 and self.level < len(self.levels) - 1:
+            self.level += 1
+        elif self.frame_ms < self.budget_ms * 0.5 and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+        self.cooldown = self.settle_frames
+        return True
+
+    @property
+    def particle_scale(self):
+        return self.levels[self.level][0]
+
+    @property
+    def spawn_scale(self):
+        return self.levels[self.level][1]
+
+    @property
+    def trail_cap(self):
+        return self.levels[self.level][2]
+
+    @property
+    def render_scale(self):
+        return self.levels[self.level][3]
+
+    def budget(self):
+        return {
+            "governor_level": self.level,
+            "frame_ms": round(self.frame_ms, 1),
+            "budget_ms": round(self.budget_ms, 1),
+            "particle_scale": self.particle_scale,
+            "spawn_scale": self.spawn_scale,
+            "trail_cap": self.trail_cap,
+            "render_scale": self.render_scale,
+        }
+
 # === Fireworks System ===
-class Particle:
-    def __init__(self, x, y, vx, vy, color, life, trail_length=5, gravity=0.1, size=3):
-        self.x = x
-        self.y = y
-        self.vx = vx
-        self.vy = vy
-        self.color = color
-        self.life = life
-        self.max_life = life
-        self.gravity = gravity
-        self.size = size
-        self.trail = []
-        self.trail_length = trail_length
-        self.sparkle = random.random() < 0.3  # 30% chance to sparkle
-        
-    def update(self):
+# Every random draw in the fireworks comes from one NumPy generator, a batch
+# at a time. Pass --seed=N to make a celebration repeat exactly.
+fireworks_seed = options.seed
+fireworks_rng = np.random.default_rng(fireworks_seed)
+
+# Pre-rendered particle circles, built on first use and bounded by an LRU.
+# Colors are packed as 0xRRGGBB ints so keys can be built in bulk with NumPy.
+class SpriteCache:
+    alpha_levels = 8  # Alpha is quantized so the number of sprites stays bounded
+
+    def __init__(self, max_sprites=2048):
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, alpha):
+        # Alpha level 0 (invisible) to alpha_levels - 1 (opaque) of 0-255 alphas
+        return (alpha.astype(np.int32) * (self.alpha_levels - 1) + 127) // 255
+
+    def get(self, color, radius, level=None):
+        if level is None:
+            level = self.alpha_levels - 1
+        key = (color, radius, level)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+        self.misses += 1
+        sprite = self.render(*key)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def render(self, color, radius, level):
+        # One pixel of margin so the sprite matches pygame.draw.circle exactly;
+        # blit it at (x - radius - 1, y - radius - 1)
+        rgb = ((color >> 16) & 255, (color >> 8) & 255, color & 255)
+        side = 2 * radius + 2
+        if level == self.alpha_levels - 1:
+            sprite = pygame.Surface((side, side)).convert()
+            sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+            pygame.draw.circle(sprite, rgb, (radius + 1, radius + 1), radius)
+        else:
+            sprite = pygame.Surface((side, side), pygame.SRCALPHA).convert_alpha()
+            alpha = 255 * level // (self.alpha_levels - 1)
+            pygame.draw.circle(sprite, rgb + (alpha,), (radius + 1, radius + 1), radius)
+        return sprite
+
+    def memory(self):
+        return sum(sprite.get_width() * sprite.get_height() * sprite.get_bytesize()
+                   for sprite in self.sprites.values())
+
+def pack_colors(colors):
+    colors = colors.astype(np.int32)
+    return (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+
+# Persistent surface that particles only stamp their heads into. Dimming it
+# by a constant factor every frame leaves fading trails behind them, at a
+# cost per particle instead of per trail point.
+class FadeLayer:
+    def __init__(self, size, fade=0.8):
+        self.surface = pygame.Surface(size).convert()
+        self.fade = fade  # Brightness kept per simulation step
+        # Steps until whatever is on the layer has faded to black
+        self.decay_steps = math.ceil(math.log(1 / 255) / math.log(fade))
+        self.steps_left = 0
+
+    def clear(self):
+        self.surface.fill((0, 0, 0))
+        self.steps_left = 0
+
+    def advance(self, drawing, steps=1):
+        # Brightness the layer keeps this frame: dimmed by however many
+        # simulation steps passed, so trails are as long at 15 fps as at 60.
+        # 0 means start over from black, None means nothing is left to show.
+        if drawing:
+            restart = self.steps_left <= 0
+            self.steps_left = self.decay_steps
+            if restart:
+                return 0.0
+        elif self.steps_left <= 0:
+            return None
+        else:
+            self.steps_left -= steps
+        return self.fade ** steps
+
+    def begin(self, drawing, steps=1):
+        # Returns whether the layer has anything to show this frame
+        keep = self.advance(drawing, steps)
+        if keep is None:
+            return False
+        level = int(255 * keep)
+        self.surface.fill((level, level, level), special_flags=pygame.BLEND_RGB_MULT)
+        return True
+
+# Software rasterizer that splats particle circles into NumPy pixel buffers
+# with additive blending, then pushes the result with one blit_array call
+class Rasterizer:
+    def __init__(self, size):
+        self.width, self.height = size
+        self.surface = pygame.Surface(size).convert()
+        # uint16 so adding two clipped layers can't wrap before the next clip
+        self.trails = np.zeros((self.width, self.height, 3), dtype=np.uint16)
+        self.frame = np.zeros((self.width, self.height, 3), dtype=np.uint16)
+        self.pixels = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+        self.disks = {}
+        self.pool = None  # Thread pool shared with the particle store, see set_fireworks_workers
+        self.workers = 1
+
+    def disk(self, radius):
+        # Pixel offsets covered by pygame.draw.circle at this radius
+        offsets = self.disks.get(radius)
+        if offsets is None:
+            stamp = pygame.Surface((2 * radius + 2, 2 * radius + 2))
+            pygame.draw.circle(stamp, (255, 255, 255), (radius + 1, radius + 1), radius)
+            dx, dy = np.nonzero(pygame.surfarray.array_red(stamp))
+            offsets = self.disks[radius] = (dx - radius - 1, dy - radius - 1)
+        return offsets
+
+    def splat(self, target, left, x, y, radius, color):
+        # Scatter-add every covered pixel of target, a strip of the buffer
+        # starting at column left. Pixels hit by several circles are merged
+        # with one sort, then summed per channel with bincount.
+        width, height = target.shape[:2]
+        near = (x + radius >= left) & (x - radius < left + width)
+        x, y, radius, color = x[near] - left, y[near], radius[near], color[near]
+        indices = []
+        colors = []
+        for r in np.unique(radius).tolist():
+            chosen = radius == r
+            dx, dy = self.disk(r)
+            px = (x[chosen, None] + dx).ravel()
+            py = (y[chosen, None] + dy).ravel()
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            indices.append(px[inside] * height + py[inside])
+            colors.append(np.repeat(color[chosen], len(dx), axis=0)[inside])
+        if not indices:
+            return
+        pixels, inverse = np.unique(np.concatenate(indices), return_inverse=True)
+        colors = np.concatenate(colors)
+        flat = target.reshape(-1, 3)
+        for channel in range(3):
+            total = np.bincount(inverse, weights=colors[:, channel], minlength=len(pixels))
+            flat[pixels, channel] += np.minimum(total, 255).astype(np.uint16)
+        np.minimum(target, 255, out=target)
+
+    def render_strip(self, left, right, circles, fade_circles, keep):
+        # Columns left..right of the frame. Strips don't share any pixels,
+        # so several can be rendered at once.
+        frame = self.frame[left:right]
+        if keep is None:
+            frame.fill(0)
+        else:
+            trails = self.trails[left:right]
+            trails *= int(256 * keep)
+            trails >>= 8
+            if fade_circles is not None:
+                self.splat(trails, left, *fade_circles)
+            np.copyto(frame, trails)
+        self.splat(frame, left, *circles)
+        np.copyto(self.pixels[left:right], frame, casting="unsafe")
+
+    def draw(self, screen, circles, fade_circles=None, keep=None):
+        # keep is the fade layer's brightness for this frame, None when idle
+        if self.pool is None:
+            self.render_strip(0, self.width, circles, fade_circles, keep)
+        else:
+            # One vertical strip per worker; NumPy's sort and arithmetic
+            # kernels release the GIL, so the strips render in parallel
+            bounds = np.linspace(0, self.width, self.workers + 1).astype(int).tolist()
+            jobs = [self.pool.submit(self.render_strip, left, right, circles, fade_circles, keep)
+                    for left, right in zip(bounds[:-1], bounds[1:])]
+            for job in jobs:
+                job.result()
+        pygame.surfarray.blit_array(self.surface, self.pixels)
+        screen.blit(self.surface, (0, 0))
+
+# Every live spark is a row in one struct-of-arrays store, so a single
+# vectorized step moves all of them no matter which firework they came from.
+class ParticleStore:
+    drag = 0.995  # Air resistance
+    buzz_interval = 8  # Frames between bee direction changes
+    buzz_strength = 0.5
+    max_trail = 20
+    shard_size = 2048  # Smallest shard worth handing to another worker
+
+    # Per-particle arrays: name, dtype, extra dimensions
+    fields = (
+        ("x", np.float32, ()),
+        ("y", np.float32, ()),
+        ("vx", np.float32, ()),
+        ("vy", np.float32, ()),
+        ("life", np.int32, ()),
+        ("max_life", np.int32, ()),
+        ("gravity", np.float32, ()),
+        ("size", np.float32, ()),
+        ("color", np.uint8, (3,)),
+        ("trail_color", np.uint8, (3,)),    # Precomputed trail palette
+        ("sparkle_color", np.uint8, (3,)),
+        ("sparkle", np.bool_, ()),
+        ("bee", np.bool_, ()),
+        ("fade_trail", np.bool_, ()),       # Trail comes from the fireworks layer
+        ("analytic", np.bool_, ()),         # Position comes from trajectory()
+        ("age", np.int32, ()),              # Steps since spawn
+        ("x0", np.float32, ()),             # Spawn state for trajectory()
+        ("y0", np.float32, ()),
+        ("vx0", np.float32, ()),
+        ("vy0", np.float32, ()),
+        ("cull_age", np.int32, ()),         # Analytic age to retire at, -1 until found
+        ("buzz_timer", np.int32, ()),
+        ("trail_length", np.int32, ()),
+        ("trail_count", np.int32, ()),
+        ("trail", np.float32, (max_trail, 2)),  # Ring buffer, see trail_head
+    )
+
+    def __init__(self, capacity=1024, high_water=8192, bounds=None):
+        # Rows are the particle pool: dead particles are compacted away and
+        # their rows handed to the next burst instead of being reallocated.
+        self.count = 0
+        self.capacity = 0
+        self.high_water = high_water  # Never hold more particles than this
+        self.resize(min(capacity, high_water))
+        self.pool_hits = 0    # Particles placed in an already allocated row
+        self.pool_misses = 0  # Particles that needed the pool to grow
+        self.peak = 0         # Most particles live at once
+        self.dropped = 0      # Particles refused at the high-water mark
+        # Screen size to retire particles beyond, or None to keep them all
+        self.bounds = bounds
+        self.culled = 0        # Particles retired early by cull()
+        self.frames_saved = 0  # Particle-frames of life they had left
+        self.pool = None      # Thread pool shared with the rasterizer
+        self.workers = 1
+        self.scale = 1.0      # Drawing scale, see set_fireworks_scale
+        # Every particle writes its trail into the same ring column each step
+        self.trail_head = 0
+        # Throughput counters for the particles/second report
+        self.particle_steps = 0
+        self.step_seconds = 0.0
+
+    def resize(self, capacity):
+        n = self.count
+        for name, dtype, shape in self.fields:
+            array = np.zeros((capacity,) + shape, dtype=dtype)
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def clear(self):
+        self.count = 0
+
+    def spawn(self, x, y, vx, vy, color, life, trail_length=5, gravity=0.1, size=3,
+              sparkle_chance=0.3, bee=False, fade_trail=False, analytic=False):
+        k = len(vx)
+        room = self.high_water - self.count
+        if k > room:
+            # Trim the burst at the high-water mark
+            self.dropped += k - max(room, 0)
+            k = max(room, 0)
+            trim = lambda values: values[:k] if np.ndim(values) else values
+            x, y, vx, vy, color, life = map(trim, (x, y, vx, vy, color, life))
+        if k == 0:
+            return
+        free = self.capacity - self.count
+        self.pool_hits += min(k, free)
+        if k > free:
+            self.pool_misses += k - free
+            self.resize(min(self.high_water, max(self.capacity * 2, self.count + k)))
+        s = slice(self.count, self.count + k)
+        self.x[s] = x
+        self.y[s] = y
+        self.vx[s] = vx
+        self.vy[s] = vy
+        self.color[s] = color
+        color = self.color[s].astype(np.int16)
+        self.trail_color[s] = np.clip(color - 50, 0, 255)
+        self.sparkle_color[s] = np.minimum(color + 50, 255)
+        self.life[s] = life
+        self.max_life[s] = life
+        self.gravity[s] = gravity
+        self.size[s] = size
+        self.sparkle[s] = fireworks_rng.random(k) < sparkle_chance
+        self.bee[s] = bee
+        self.fade_trail[s] = fade_trail
+        # Buzzing bees can't follow a closed-form path
+        self.analytic[s] = analytic and not bee
+        self.age[s] = 0
+        self.x0[s] = self.x[s]
+        self.y0[s] = self.y[s]
+        self.vx0[s] = self.vx[s]
+        self.vy0[s] = self.vy[s]
+        self.cull_age[s] = -1
+        self.buzz_timer[s] = 0
+        self.trail_length[s] = min(trail_length, self.max_trail)
+        self.trail_count[s] = 0
+        self.count += k
+        self.peak = max(self.peak, self.count)
+
+    def step(self):
+        n = self.count
+        if n == 0:
+            return
+        started = time.perf_counter()
+        self.trail_head = (self.trail_head + 1) % self.max_trail
+
+        analytic = self.analytic[:n]
+        if not analytic.any():
+            # Large stores are integrated in contiguous shards on the worker
+            # pool. Bees then draw their buzz from several threads, so runs
+            # with more than one worker aren't bit-for-bit reproducible.
+            shards = max(1, min(self.workers, n // self.shard_size)) if self.pool else 1
+            bounds = np.linspace(0, n, shards + 1).astype(int).tolist()
+            jobs = [(slice(lo, hi), self.x[lo:hi], self.y[lo:hi], self.vx[lo:hi],
+                     self.vy[lo:hi], self.buzz_timer[lo:hi])
+                    for lo, hi in zip(bounds[:-1], bounds[1:])]
+            if shards > 1:
+                for job in [self.pool.submit(self.integrate, *args) for args in jobs]:
+                    job.result()
+            else:
+                self.integrate(*jobs[0])
+        else:
+            # Analytic particles only age, their positions are evaluated on demand
+            rows = np.flatnonzero(~analytic)
+            if len(rows):
+                arrays = (self.x, self.y, self.vx, self.vy, self.buzz_timer)
+                state = [array[rows] for array in arrays]
+                self.integrate(rows, *state)
+                for array, values in zip(arrays, state):
+                    array[rows] = values
+
+        trail_count = self.trail_count[:n]
+        trail_count += 1
+        np.minimum(trail_count, self.trail_length[:n], out=trail_count)
+        self.life[:n] -= 1
+        self.age[:n] += 1
+        if self.bounds is not None:
+            self.cull()
+
+        alive = self.life[:n] > 0
+        if not alive.all():
+            self.compact(alive)
+
+        self.particle_steps += n
+        self.step_seconds += time.perf_counter() - started
+
+    def integrate(self, rows, x, y, vx, vy, timer):
+        # One explicit step for the given rows, updating the arrays passed in
+        # Bee particles get a new random buzz impulse every few frames
+        bee = self.bee[rows]
+        if bee.any():
+            timer += bee
+            buzz = bee & (timer % self.buzz_interval == 0)
+            k = np.count_nonzero(buzz)
+            if k:
+                direction = fireworks_rng.uniform(0, 2 * math.pi, k)
+                vx[buzz] += np.cos(direction) * self.buzz_strength
+                vy[buzz] += np.sin(direction) * self.buzz_strength
+
         # Add current position to trail
-        self.trail.append((self.x, self.y))
-        if len(self.trail) > self.trail_length:
-            self.trail.pop(0)
-            
-        self.x += self.vx
-        self.y += self.vy
-        self.vy += self.gravity
-        self.life -= 1
-        
+        self.trail[rows, self.trail_head, 0] = x
+        self.trail[rows, self.trail_head, 1] = y
+
+        x += vx
+        y += vy
+        vy += self.gravity[rows]
+
         # Add some air resistance
-        self.vx *= 0.995
-        self.vy *= 0.995
-        
-    def draw(self, screen):
-        if self.life > 0:
-            alpha = int(255 * (self.life / self.max_life))
-            size = max(1, int(self.size * (self.life / self.max_life)))
-            
-            # Draw trail
-            for i, (tx, ty) in enumerate(self.trail):
-                trail_alpha = int(alpha * (i / len(self.trail)) * 0.5)
-                trail_size = max(1, int(size * (i / len(self.trail))))
-                trail_color = tuple(max(0, min(255, c - 50)) for c in self.color)
-                pygame.draw.circle(screen, trail_color, (int(tx), int(ty)), trail_size)
-            
-            # Draw main particle
-            if self.sparkle and (self.life % 6 < 3):
-                # Sparkle effect
-                sparkle_color = tuple(min(255, c + 50) for c in self.color)
-                pygame.draw.circle(screen, sparkle_color, (int(self.x), int(self.y)), size + 1)
-            
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), size)
+        vx *= self.drag
+        vy *= self.drag
+
+    def cull(self):
+        # Retire particles that have left the screen for good: falling past
+        # the bottom or flying out past a side, with their whole trail gone
+        # too. Gravity only pulls down and drag never flips a velocity, so
+        # they can't come back; bees can buzz back and are left alone.
+        # Analytic particles are retired at an age found once from their
+        # trajectory, so their positions are never evaluated here.
+        n = self.count
+        analytic = self.analytic[:n]
+        pending = np.flatnonzero(analytic & (self.cull_age[:n] < 0))
+        if len(pending):
+            self.cull_age[pending] = self.exit_ages(pending)
+        expired = np.flatnonzero(analytic & (self.age[:n] >= self.cull_age[:n]))
+
+        width, height = self.bounds
+        x, y, vx, vy = self.x[:n], self.y[:n], self.vx[:n], self.vy[:n]
+        margin = self.size[:n] + 1  # Sparkle halos are a pixel larger
+        rows = np.flatnonzero(~self.bee[:n] & ~analytic &
+                              (((y - margin > height) & (vy > 0)) |
+                               ((x + margin < 0) & (vx < 0)) |
+                               ((x - margin > width) & (vx > 0))))
+        if len(rows):
+            # Trail points of the candidates, one column per ring slot
+            back = (self.trail_head - np.arange(self.max_trail)) % self.max_trail  # Steps ago
+            valid = back[None, :] < self.trail_count[rows, None]
+            trail_x = self.trail[rows, :, 0]
+            trail_y = self.trail[rows, :, 1]
+            x, y, vx, vy, margin = x[rows], y[rows], vx[rows], vy[rows], margin[rows]
+            top = np.minimum(np.where(valid, trail_y, np.inf).min(axis=1), y)
+            left = np.minimum(np.where(valid, trail_x, np.inf).min(axis=1), x)
+            right = np.maximum(np.where(valid, trail_x, -np.inf).max(axis=1), x)
+            gone = (((top - margin > height) & (vy > 0)) | ((right + margin < 0) & (vx < 0)) |
+                    ((left - margin > width) & (vx > 0)))
+            rows = rows[gone]
+        rows = np.concatenate((rows, expired))
+        if not len(rows):
+            return
+        self.culled += len(rows)
+        self.frames_saved += int(self.life[rows].sum())
+        self.life[rows] = 0
+
+    def exit_ages(self, rows):
+        # Age from which each analytic particle and its whole trail are off
+        # screen for good. Once off it stays off, so the head's first age
+        # off screen is found by bisection over its life, and the trail
+        # follows within trail_length steps.
+        low = np.zeros(len(rows), dtype=np.int64)
+        high = (self.age[rows] + self.life[rows]).astype(np.int64)
+        never = ~self.off_screen(rows, high)
+        while (low < high).any():
+            middle = (low + high) // 2
+            off = self.off_screen(rows, middle)
+            high = np.where(off, middle, high)
+            low = np.where(off, low, middle + 1)
+        ages = np.where(never, np.iinfo(np.int32).max - self.max_trail, high)
+        return ages + self.trail_length[rows]
+
+    def off_screen(self, rows, t):
+        # Whether analytic heads at age t are past the bottom or a side and
+        # still heading away from the screen
+        width, height = self.bounds
+        x, y = self.trajectory(rows, t)
+        decay = self.drag ** t
+        terminal = self.gravity[rows] * (self.drag / (1 - self.drag))
+        vx = self.vx0[rows] * decay
+        vy = terminal + (self.vy0[rows] - terminal) * decay
+        margin = self.size[rows] + 1
+        return (((y - margin > height) & (vy > 0)) | ((x + margin < 0) & (vx < 0)) |
+                ((x - margin > width) & (vx > 0)))
+
+    def trajectory(self, rows, t):
+        # Closed form of integrate() after t steps without buzz: vx decays by
+        # drag each step, and vy relaxes towards its terminal g * d / (1 - d)
+        d = self.drag
+        spread = (1 - d ** t) / (1 - d)  # Sum of d^j for j < t
+        terminal = self.gravity[rows] * (d / (1 - d))
+        x = self.x0[rows] + self.vx0[rows] * spread
+        y = self.y0[rows] + terminal * t + (self.vy0[rows] - terminal) * spread
+        return x, y
+
+    def evaluate(self):
+        # Bring the x/y/vx/vy arrays of analytic particles up to date
+        rows = np.flatnonzero(self.analytic[:self.count])
+        if len(rows):
+            age = self.age[rows]
+            self.x[rows], self.y[rows] = self.trajectory(rows, age)
+            decay = self.drag ** age
+            terminal = self.gravity[rows] * (self.drag / (1 - self.drag))
+            self.vx[rows] = self.vx0[rows] * decay
+            self.vy[rows] = terminal + (self.vy0[rows] - terminal) * decay
+
+    def compact(self, alive):
+        # Swap-remove: fill each dead row in the front with a live row from
+        # the tail, so only as many rows move as there are holes
+        n = self.count
+        k = int(np.count_nonzero(alive))
+        holes = np.flatnonzero(~alive[:k])
+        if len(holes):
+            movers = np.flatnonzero(alive[k:n]) + k
+            for name, dtype, shape in self.fields:
+                array = getattr(self, name)
+                array[holes] = array[movers]
+        self.count = k
+
+    def cap_trails(self, limit):
+        # Shorten live trails when the frame-time governor sheds load
+        n = self.count
+        np.minimum(self.trail_length[:n], limit, out=self.trail_length[:n])
+        np.minimum(self.trail_count[:n], limit, out=self.trail_count[:n])
+
+    def fading(self):
+        # Whether any live particle draws its trail through the fireworks layer
+        return bool(self.fade_trail[:self.count].any())
+
+    def rate(self):
+        # Particles integrated per second of step time
+        if self.step_seconds == 0:
+            return 0.0
+        return self.particle_steps / self.step_seconds
+
+    def circles(self, fade=False, blend=1.0, alpha=False):
+        # Circles of the particles with (fade=True) or without faded trails as
+        # flat arrays in painter's order: trail points oldest first, then
+        # sparkle halos, then particle heads. Heads are drawn blend of the way
+        # from their previous step to their current one. alpha=True adds a
+        # fifth array of alphas that fade out with life, trails at half.
+        rows = np.flatnonzero(self.fade_trail[:self.count] == fade)
+        life = self.life[rows]
+        sizes = np.maximum(1, (self.size[rows] * (life / self.max_life[rows])).astype(np.int32))
+        x = self.x[rows]
+        y = self.y[rows]
+        if blend < 1:
+            # The newest trail column holds the position before the last step
+            moved = self.trail_count[rows] > 0
+            previous = self.trail[rows, self.trail_head]
+            x = np.where(moved, previous[:, 0] + (x - previous[:, 0]) * blend, x)
+            y = np.where(moved, previous[:, 1] + (y - previous[:, 1]) * blend, y)
+        analytic = np.flatnonzero(self.analytic[rows])
+        if len(analytic):
+            # Analytic heads are evaluated at their fractional age directly
+            x = x.astype(np.float64)
+            y = y.astype(np.float64)
+            t = np.maximum(self.age[rows[analytic]] - 1 + blend, 0)
+            x[analytic], y[analytic] = self.trajectory(rows[analytic], t)
+        x = x.astype(np.int32)
+        y = y.astype(np.int32)
+
+        # Trail points, walking the ring from its oldest column to the newest.
+        # Faded trails live in the fireworks layer, so those only draw heads.
+        if fade:
+            counts = np.zeros(len(rows), dtype=np.int32)
+        else:
+            counts = self.trail_count[rows]
+        back = np.arange(self.max_trail - 1, -1, -1)  # Steps ago, oldest first
+        steps, points = np.nonzero(back[:, None] < counts[None, :])
+        back = back[steps]
+        column = (self.trail_head - back) % self.max_trail
+        trail_x = self.trail[rows[points], column, 0]
+        trail_y = self.trail[rows[points], column, 1]
+        analytic = np.flatnonzero(self.analytic[rows[points]])
+        if len(analytic):
+            # Analytic trails are samples of the trajectory at age - 1 - back
+            trail_x = trail_x.astype(np.float64)
+            trail_y = trail_y.astype(np.float64)
+            sampled = rows[points][analytic]
+            trail_x[analytic], trail_y[analytic] = self.trajectory(
+                sampled, self.age[sampled] - 1 - back[analytic])
+        trail_x = trail_x.astype(np.int32)
+        trail_y = trail_y.astype(np.int32)
+        # Point i of a trail with count points is drawn at size * i / count
+        index = counts[points] - 1 - back
+        trail_r = np.maximum(1, (sizes[points] * (index / counts[points])).astype(np.int32))
+
+        sparkling = self.sparkle[rows] & (life % 6 < 3)
+
+        x = np.concatenate((trail_x, x[sparkling], x))
+        y = np.concatenate((trail_y, y[sparkling], y))
+        radius = np.concatenate((trail_r, sizes[sparkling] + 1, sizes))
+        color = np.concatenate((self.trail_color[rows[points]], self.sparkle_color[rows[sparkling]],
+                                self.color[rows]))
+        if self.scale != 1:
+            # Drawing into a reduced fireworks canvas
+            x = (x * self.scale).astype(np.int32)
+            y = (y * self.scale).astype(np.int32)
+            radius = np.maximum(1, np.rint(radius * self.scale).astype(np.int32))
+        if not alpha:
+            return x, y, radius, color
+        heads = 255 * life / self.max_life[rows]
+        trails = heads[points] * (index / counts[points]) * 0.5
+        alphas = np.concatenate((trails, heads[sparkling], heads)).astype(np.uint8)
+        return x, y, radius, color, alphas
+
+    def draw(self, screen, fade=False, blend=1.0):
+        if self.count:
+            draw_circles(screen, self.circles(fade, blend))
+
+def circle_blits(circles, sort_by_sprite=False):
+    # (sprite, dest) pairs drawing circles with one Surface.blits call.
+    # Circles with alphas use the sprite of their quantized alpha level.
+    x, y, radius, color = circles[:4]
+    level = sprite_cache.alpha_levels - 1
+    if len(circles) == 5:
+        level = sprite_cache.quantize(circles[4])
+        visible = level > 0
+        x, y, radius, color, level = (x[visible], y[visible], radius[visible], color[visible],
+                                      level[visible])
+    if len(x) == 0:
+        return []
+    # Look each distinct sprite up once per frame, then pick by index. Keys
+    # pack color, radius (6 bits) and alpha level (3 bits).
+    keys = (((pack_colors(color).astype(np.int64) << 6) | radius) << 3) | level
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sprites = np.empty(len(unique), dtype=object)
+    sprites[:] = [sprite_cache.get(key >> 9, (key >> 3) & 63, key & 7) for key in unique.tolist()]
+    if sort_by_sprite:
+        # Group blits of the same sprite together; overlapping circles may
+        # then stack in a different order
+        order = np.argsort(inverse, kind="stable")
+        inverse, x, y, radius = inverse[order], x[order], y[order], radius[order]
+    dests = np.stack((x - radius - 1, y - radius - 1), axis=1).tolist()
+    return list(zip(sprites[inverse].tolist(), dests))
+
+def premultiplied(circles):
+    # Circles with alphas as opaque circles of alpha-scaled color, which is
+    # exact for additive blending and for drawing over black
+    if len(circles) == 4:
+        return circles
+    x, y, radius, color, alpha = circles
+    color = (color.astype(np.uint16) * alpha[:, None].astype(np.uint16) // 255).astype(np.uint8)
+    return x, y, radius, color
+
+def draw_circles(screen, circles):
+    # Circles in painter's order with the configured fireworks renderer
+    if fireworks_renderer == "sprites":
+        screen.blits(circle_blits(circles, fireworks_sort_sprites), doreturn=False)
+    elif fireworks_renderer == "raster":
+        rasterizer.draw(screen, premultiplied(circles))
+    else:
+        x, y, radius, color = premultiplied(circles)
+        draw_circle = pygame.draw.circle
+        for center, r, rgb in zip(np.stack((x, y), axis=1).tolist(), radius.tolist(),
+                                  color.tolist()):
+            draw_circle(screen, rgb, center, r)
+
+# === Fireworks Snapshots ===
+# Everything needed to draw one frame of fireworks, copied out of the
+# simulation into buffers that are reused from frame to frame
+class FireworksFrame:
+    def __init__(self):
+        self.buffers = {}
+        self.fade = None     # Circles of particles with faded trails
+        self.circles = None  # Rockets, then point trails, halos and heads
+        self.fading = False  # Whether anything draws into the fade layer
+        self.steps = 0       # Simulation steps taken when captured
+
+    def store(self, name, arrays):
+        # Copy arrays into this frame's buffers, growing them as needed
+        views = []
+        for index, array in enumerate(arrays):
+            buffer = self.buffers.get((name, index))
+            if buffer is None or len(buffer) < len(array):
+                size = max(len(array), 256 if buffer is None else 2 * len(buffer))
+                buffer = np.empty((size,) + array.shape[1:], dtype=array.dtype)
+                self.buffers[name, index] = buffer
+            buffer[:len(array)] = array
+            views.append(buffer[:len(array)])
+        setattr(self, name, tuple(views))
+
+# Triple buffer between the simulation thread and the renderer: the
+# simulation fills the back frame while the renderer holds another, and only
+# the swap of frame indices happens under the lock, so neither side ever
+# waits for the other to finish a frame
+class SnapshotBuffer:
+    def __init__(self):
+        self.frames = [FireworksFrame() for _ in range(3)]
+        self.lock = threading.Lock()
+        self.back = 0         # Frame the simulation is filling
+        self.latest = None    # Newest complete frame
+        self.reading = None   # Frame the renderer holds
+        self.published = 0
+
+    def back_frame(self):
+        return self.frames[self.back]
+
+    def publish(self):
+        with self.lock:
+            self.latest = self.back
+            self.back = next(i for i in range(3) if i != self.latest and i != self.reading)
+            self.published += 1
+
+    def acquire(self):
+        # Newest complete frame, held until release(); None before the first
+        with self.lock:
+            self.reading = self.latest
+        return None if self.reading is None else self.frames[self.reading]
+
+    def release(self):
+        with self.lock:
+            self.reading = None
 
 class Firework:
+    __slots__ = ("x", "y", "px", "py", "vx", "vy", "color", "fuse", "firework_type", "exploded",
+                 "particle_frames")
+    # Launch draws in one batch: vy, vx, red, green, blue, fuse, type
+    launch_low = np.array([-15, -2, 100, 100, 100, 60, 0])
+    launch_high = np.array([-10, 2, 256, 256, 256, 121, 1])
+
     def __init__(self, x, y, firework_type=None):
-        self.x = x
-        self.y = y
-        self.particles = []
+        self.x = self.px = x
+        self.y = self.py = y
+        self.particle_frames = 0  # Frames until the last spawned particle burns out
         self.exploded = False
-        self.vy = random.uniform(-15, -10)
-        self.vx = random.uniform(-2, 2)
-        self.color = (random.randint(100, 255), random.randint(100, 255), random.randint(100, 255))
-        self.fuse = random.randint(60, 120)
-        self.firework_type = firework_type or random.choice(['brocade', 'willow', 'bee', 'palm', 'star', 'classic'])
+        vy, vx, red, green, blue, fuse, pick = fireworks_rng.uniform(self.launch_low,
+                                                                     self.launch_high).tolist()
+        self.vy = vy
+        self.vx = vx
+        self.color = (int(red), int(green), int(blue))
+        self.fuse = int(fuse)
+        self.firework_type = firework_type or firework_types[int(pick * len(firework_types))]
         
     def update(self):
         if not self.exploded:
+            self.px, self.py = self.x, self.y
             self.x += self.vx
             self.y += self.vy
             self.vy += 0.1
@@ -97,220 +846,542 @@ class Firework:
             
             if self.fuse <= 0 or self.vy > 0:
                 self.explode()
-        else:
-            for particle in self.particles[:]:
-                particle.update()
-                if particle.life <= 0:
-                    self.particles.remove(particle)
+        elif self.particle_frames > 0:
+            self.particle_frames -= 1
                     
     def explode(self):
         self.exploded = True
-        
-        if self.firework_type == 'brocade':
-            self.create_brocade()
-        elif self.firework_type == 'willow':
-            self.create_willow()
-        elif self.firework_type == 'bee':
-            self.create_bee()
-        elif self.firework_type == 'palm':
-            self.create_palm()
-        elif self.firework_type == 'star':
-            self.create_star()
-        else:
-            self.create_classic()
-    
-    def create_brocade(self):
-        # Brocade: Symmetrical burst with long golden trails that droop gracefully
-        # Use primarily golden colors with some variation
-        colors = [
-            (255, 215, 0),   # Gold
-            (255, 223, 0),   # Light gold
-            (255, 200, 0),   # Deep gold
-            (255, 235, 59),  # Bright gold
-            (255, 193, 7),   # Amber gold
-        ]
-        
-        # Create main burst pattern - more organized than random
-        num_main_rays = 16  # Even number for symmetry
-        particles_per_ray = 2  # Multiple particles per ray for thickness
-        
-        for ray in range(num_main_rays):
-            # Calculate angle for each ray
-            base_angle = (ray / num_main_rays) * 2 * math.pi
-            
-            for p in range(particles_per_ray):
-                # Add slight angle variation for each particle in the ray
-                angle_variation = random.uniform(-0.1, 0.1)
-                angle = base_angle + angle_variation
-                
-                # Vary speed slightly for more natural look
-                speed = random.uniform(6, 9) + p * 0.5
-                vx = math.cos(angle) * speed
-                vy = math.sin(angle) * speed
-                
-                # Longer life for characteristic long trails
-                life = random.randint(80, 120)
-                color = random.choice(colors)
-                
-                # Create particle with long trail and moderate gravity for drooping effect
-                particle = Particle(
-                    self.x, self.y, vx, vy, color, life, 
-                    trail_length=20,  # Long trails
-                    gravity=0.08,     # Moderate gravity for graceful droop
-                    size=3
-                )
-                self.particles.append(particle)
-        
-        # Add some secondary particles for the crackling effect
-        num_secondary = random.randint(12, 20)
-        for _ in range(num_secondary):
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(3, 6)
-            vx = math.cos(angle) * speed
-            vy = math.sin(angle) * speed
-            life = random.randint(40, 70)
-            color = random.choice(colors)
-            
-            # Smaller particles with shorter trails for crackling effect
-            particle = Particle(
-                self.x, self.y, vx, vy, color, life,
-                trail_length=8,
-                gravity=0.12,
-                size=2
-            )
-            # Make some particles sparkle more for crackling effect
-            particle.sparkle = random.random() < 0.7  # Higher sparkle chance
-            self.particles.append(particle)
-    
-    def create_willow(self):
-        # Willow: Drooping, long-lasting trails
-        colors = [(0, 255, 0), (34, 139, 34), (50, 205, 50)]  # Green variations
-        num_particles = random.randint(15, 25)
-        for _ in range(num_particles):
-            angle = random.uniform(-math.pi/3, math.pi/3)  # More upward spread
-            speed = random.uniform(5, 12)
-            vx = math.cos(angle) * speed
-            vy = math.sin(angle) * speed - 2  # Slight upward bias
-            life = random.randint(80, 120)  # Long-lasting
-            color = random.choice(colors)
-            particle = Particle(self.x, self.y, vx, vy, color, life, trail_length=15, gravity=0.05, size=2)
-            self.particles.append(particle)
-    
-    def create_bee(self):
-        # Bee: Chaotic, buzzing motion
-        colors = [(255, 255, 0), (255, 165, 0), (255, 140, 0)]  # Yellow/orange
-        num_particles = random.randint(8, 15)
-        for _ in range(num_particles):
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(2, 6)
-            vx = math.cos(angle) * speed
-            vy = math.sin(angle) * speed
-            life = random.randint(60, 100)
-            color = random.choice(colors)
-            # Add random velocity changes for buzzing effect
-            particle = BeeParticle(self.x, self.y, vx, vy, color, life)
-            self.particles.append(particle)
-    
-    def create_palm(self):
-        # Palm: Upward burst with falling trails
-        colors = [(255, 0, 0), (255, 69, 0), (255, 140, 0)]  # Red/orange
-        num_particles = random.randint(12, 20)
-        for _ in range(num_particles):
-            angle = random.uniform(-math.pi/2 - 0.5, -math.pi/2 + 0.5)  # Mostly upward
-            speed = random.uniform(8, 15)
-            vx = math.cos(angle) * speed
-            vy = math.sin(angle) * speed
-            life = random.randint(50, 90)
-            color = random.choice(colors)
-            particle = Particle(self.x, self.y, vx, vy, color, life, trail_length=12, gravity=0.15, size=3)
-            self.particles.append(particle)
-    
-    def create_star(self):
-        # Star: Perfect symmetrical burst
-        colors = [(255, 255, 255), (255, 0, 255), (0, 255, 255)]  # Bright colors
-        num_rays = 8
-        particles_per_ray = 3
-        for ray in range(num_rays):
-            angle = (ray / num_rays) * 2 * math.pi
-            for p in range(particles_per_ray):
-                speed = 4 + p * 2
-                vx = math.cos(angle) * speed
-                vy = math.sin(angle) * speed
-                life = random.randint(45, 75)
-                color = random.choice(colors)
-                particle = Particle(self.x, self.y, vx, vy, color, life, trail_length=6, size=4)
-                self.particles.append(particle)
+        firework_spawners[self.firework_type].explode(self)
+
+    def emit(self, vx, vy, colors, lives, trail_length=5, **kwargs):
+        # Thin the burst evenly when the frame-time governor is shedding load
+        scale = governor.particle_scale
+        if scale < 1 and len(lives) > 1:
+            kept = max(1, round(len(lives) * scale))
+            keep = np.linspace(0, len(lives) - 1, kept).round().astype(np.intp)
+            vx, vy, colors, lives = (np.asarray(values)[keep] for values in (vx, vy, colors, lives))
+
+        # Hand a batch of particles over to the shared store
+        spawner = firework_spawners[self.firework_type]
+        particle_store.spawn(self.x, self.y, vx, vy, colors, lives,
+                             trail_length=min(trail_length, governor.trail_cap),
+                             fade_trail=spawner.fade_trail, analytic=spawner.analytic, **kwargs)
+        if len(lives):
+            self.particle_frames = max(self.particle_frames, int(np.max(lives)))
     
-    def create_classic(self):
-        # Classic: Regular circular burst
-        num_particles = random.randint(15, 30)
-        for _ in range(num_particles):
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(2, 8)
-            vx = math.cos(angle) * speed
-            vy = math.sin(angle) * speed
-            life = random.randint(30, 60)
-            particle = Particle(self.x, self.y, vx, vy, self.color, life)
-            self.particles.append(particle)
-            
-    def draw(self, screen):
-        if not self.exploded:
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), 3)
-        else:
-            for particle in self.particles:
-                particle.draw(screen)
-                
+    def position(self, blend=1.0, scale=1.0):
+        # Rocket position blend of the way through the current step
+        return (int((self.px + (self.x - self.px) * blend) * scale),
+                int((self.py + (self.y - self.py) * blend) * scale))
+
     def is_finished(self):
-        return self.exploded and len(self.particles) == 0
+        return self.exploded and self.particle_frames <= 0
 
-class BeeParticle(Particle):
-    def __init__(self, x, y, vx, vy, color, life):
-        super().__init__(x, y, vx, vy, color, life, trail_length=3, gravity=0.05, size=2)
-        self.buzz_timer = 0
-        self.buzz_direction = random.uniform(0, 2 * math.pi)
-        
-    def update(self):
-        # Add buzzing motion
-        self.buzz_timer += 1
-        if self.buzz_timer % 8 == 0:
-            self.buzz_direction = random.uniform(0, 2 * math.pi)
-            buzz_strength = 0.5
-            self.vx += math.cos(self.buzz_direction) * buzz_strength
-            self.vy += math.sin(self.buzz_direction) * buzz_strength
-        
-        super().update()
+# === Firework Types ===
+# Every firework type is declared here: how often it is launched, how its
+# trails are drawn and the bursts it explodes into. A burst is either 'rays'
+# evenly spaced rays of 'per_ray' particles, or a random 'count' of particles
+# spread over the 'spread' angle range (the full circle when left out).
+# Speeds, lives and spreads are (low, high) ranges. Trails default to
+# 'fade', a smear in the fireworks layer; 'points' redraws past positions.
+# 'analytic': True moves a type's particles on closed-form trajectories
+# instead of integrating them step by step.
+gold = [(255, 215, 0), (255, 223, 0), (255, 200, 0), (255, 235, 59), (255, 193, 7)]
+firework_registry = {
+    # Symmetrical burst with long golden trails that droop gracefully, plus
+    # smaller crackling particles
+    'brocade': {
+        'weight': 0.2,
+        'trail_mode': 'points',
+        'bursts': [
+            {'rays': 16, 'per_ray': 2, 'jitter': 0.1, 'speed': (6, 9), 'ray_speed': 0.5,
+             'life': (80, 120), 'palette': gold, 'trail': 20, 'gravity': 0.08, 'size': 3},
+            {'count': (12, 20), 'speed': (3, 6), 'life': (40, 70), 'palette': gold,
+             'trail': 8, 'gravity': 0.12, 'size': 2, 'sparkle': 0.7},
+        ],
+    },
+    # Drooping, long-lasting trails with an upward spread
+    'willow': {
+        'weight': 0.15,
+        'trail_mode': 'points',
+        'bursts': [
+            {'count': (15, 25), 'spread': (-math.pi/3, math.pi/3), 'speed': (5, 12), 'lift': 2,
+             'life': (80, 120), 'palette': [(0, 255, 0), (34, 139, 34), (50, 205, 50)],
+             'trail': 15, 'gravity': 0.05, 'size': 2},
+        ],
+    },
+    # Chaotic, buzzing motion; bees are always integrated, never analytic
+    'bee': {
+        'weight': 0.1,
+        'bursts': [
+            {'count': (8, 15), 'speed': (2, 6), 'life': (60, 100),
+             'palette': [(255, 255, 0), (255, 165, 0), (255, 140, 0)],
+             'trail': 3, 'gravity': 0.05, 'size': 2, 'bee': True},
+        ],
+    },
+    # Mostly upward burst with falling trails
+    'palm': {
+        'weight': 0.2,
+        'bursts': [
+            {'count': (12, 20), 'spread': (-math.pi/2 - 0.5, -math.pi/2 + 0.5), 'speed': (8, 15),
+             'life': (50, 90), 'palette': [(255, 0, 0), (255, 69, 0), (255, 140, 0)],
+             'trail': 12, 'gravity': 0.15, 'size': 3},
+        ],
+    },
+    # Perfect symmetrical burst
+    'star': {
+        'weight': 0.15,
+        'bursts': [
+            {'rays': 8, 'per_ray': 3, 'speed': (4, 4), 'ray_speed': 2, 'life': (45, 75),
+             'palette': [(255, 255, 255), (255, 0, 255), (0, 255, 255)], 'trail': 6, 'size': 4},
+        ],
+    },
+    # Regular circular burst in the rocket's own color
+    'classic': {
+        'weight': 0.2,
+        'bursts': [
+            {'count': (15, 30), 'speed': (2, 8), 'life': (30, 60)},
+        ],
+    },
+}
+
+# === Compiled Spawners ===
+# The trig and random draws for each burst are done once, into a bank of
+# pre-computed particles. An explosion copies a slice of the bank, so the
+# frame where four fireworks go off together stays cheap.
+class BurstGroup:
+    bank_size = 1536  # Rounded down to a whole number of patterns
+
+    def __init__(self, count, angles, speeds, lives, colors=None, pattern=1, rotate=False,
+                 vy_bias=0.0, **spawn):
+        # count: (min, max) particles per burst, or None for one whole pattern.
+        # Symmetric bursts are stored as consecutive patterns of that many
+        # particles, so a slice always starts on a pattern boundary.
+        self.count = count
+        self.pattern = pattern
+        self.rotate = rotate  # Spin the whole burst by a random angle
+        self.vx = np.cos(angles) * speeds
+        self.vy = np.sin(angles) * speeds + vy_bias
+        self.lives = lives.astype(np.int32)
+        self.colors = colors  # None uses the firework's own color
+        self.spawn = spawn
+
+    def emit(self, firework):
+        size, offset, turn = fireworks_rng.random(3).tolist()
+        if self.count is None:
+            k = self.pattern
+        else:
+            low, high = self.count
+            k = low + int(size * (high - low + 1))
+        bank = len(self.lives)
+        start = int(offset * (bank // self.pattern)) * self.pattern
+        rows = np.arange(start, start + k) % bank
+        vx = self.vx[rows]
+        vy = self.vy[rows]
+        if self.rotate:
+            angle = turn * 2 * math.pi
+            c, s = math.cos(angle), math.sin(angle)
+            vx, vy = vx * c - vy * s, vx * s + vy * c
+        if self.colors is None:
+            colors = np.tile(np.array(firework.color, dtype=np.uint8), (k, 1))
+        else:
+            colors = self.colors[rows]
+        firework.emit(vx, vy, colors, self.lives[rows], **self.spawn)
+
+def spawn_options(spec):
+    # ParticleStore.spawn keyword arguments of a burst spec
+    return {name: spec[key] for key, name in (('trail', 'trail_length'), ('gravity', 'gravity'),
+                                              ('size', 'size'), ('sparkle', 'sparkle_chance'),
+                                              ('bee', 'bee')) if key in spec}
+
+def compile_burst(spec):
+    pattern = spec.get('rays', 1) * spec.get('per_ray', 1)
+    bank = max(1, BurstGroup.bank_size // pattern) * pattern
+    speeds = fireworks_rng.uniform(*spec['speed'], bank)
+    if 'rays' in spec:
+        # Ray angle and index within the ray for every particle of each pattern
+        index = np.arange(bank)
+        angles = index // spec['per_ray'] % spec['rays'] * (2 * math.pi / spec['rays'])
+        jitter = spec.get('jitter', 0.0)
+        angles = angles + fireworks_rng.uniform(-jitter, jitter, bank)
+        speeds = speeds + index % spec['per_ray'] * spec.get('ray_speed', 0.0)
+        count, rotate = None, False
+    else:
+        spread = spec.get('spread')
+        angles = fireworks_rng.uniform(*(spread or (0, 2 * math.pi)), bank)
+        count, rotate = spec['count'], spread is None
+    low, high = spec['life']
+    lives = fireworks_rng.integers(low, high + 1, bank)
+    colors = None
+    if 'palette' in spec:
+        palette = np.array(spec['palette'], dtype=np.uint8)
+        colors = palette[fireworks_rng.integers(len(palette), size=bank)]
+    return BurstGroup(count, angles, speeds, lives, colors, pattern, rotate,
+                      -spec.get('lift', 0.0), **spawn_options(spec))
+
+class FireworkSpawner:
+    def __init__(self, spec):
+        self.weight = spec.get('weight', 0.0)
+        self.fade_trail = spec.get('trail_mode', 'fade') == 'fade'
+        # Closed-form trajectories instead of step-by-step integration
+        self.analytic = spec.get('analytic', False)
+        self.bursts = [compile_burst(burst) for burst in spec['bursts']]
+
+    def explode(self, firework):
+        for burst in self.bursts:
+            burst.emit(firework)
+
+def compile_firework_types():
+    global firework_spawners, firework_types, firework_weight_edges
+    firework_spawners = {name: FireworkSpawner(spec) for name, spec in firework_registry.items()}
+    firework_types = list(firework_spawners)
+    # Cumulative launch weights, for picking a type with one uniform draw
+    weights = np.array([spawner.weight for spawner in firework_spawners.values()])
+    firework_weight_edges = np.cumsum(weights) / weights.sum()
+
+compile_firework_types()
+
+def seed_fireworks(seed):
+    # Restart the generator and recompile the banks drawn from it, so the
+    # same seed gives the same celebration
+    global fireworks_rng
+    fireworks_rng = np.random.default_rng(seed)
+    compile_firework_types()
 
 # Fireworks manager
+governor = FrameGovernor(target_fps)
+# 'sprites' (cached blits), 'raster' (NumPy pixel buffer) or 'circles' (pygame.draw),
+# chosen at startup with e.g. --renderer=raster
+fireworks_renderer = options.renderer
+fireworks_sort_sprites = False  # Group sprite blits by sprite for cache locality
+# Fade particles and trails out with real alpha (--alpha) rather than only
+# by shrinking them. Sprites blend per-pixel-alpha sprites at a few alpha
+# levels; the other renderers use premultiplied colors.
+fireworks_alpha = options.alpha
+sprite_cache = SpriteCache()
+fade_layer = FadeLayer((screen_width, screen_height))
+rasterizer = Rasterizer((screen_width, screen_height))
+
+# Worker threads for sharded particle steps and tiled rasterization,
+# e.g. --workers=4 on a Pi 4
+fireworks_workers = options.workers
+fireworks_pool = None
+
+def set_fireworks_workers(workers, stores=()):
+    global fireworks_pool
+    if fireworks_pool is not None:
+        fireworks_pool.shutdown()
+    fireworks_pool = ThreadPoolExecutor(workers) if workers > 1 else None
+    for target in (rasterizer, particle_store) + tuple(stores):
+        target.pool = fireworks_pool
+        target.workers = workers
+particle_high_water = 8192  # Particle pool limit, bursts beyond it are trimmed
+particle_store = ParticleStore(high_water=particle_high_water,
+                               bounds=(screen_width, screen_height))
+set_fireworks_workers(fireworks_workers)
 fireworks = []
 firework_timer = 0
 
+# Fraction of the screen size the fireworks are drawn at, smoothscaled up
+# beneath the UI. --fireworks-scale=0.5 suits 4K panels; 'auto' lets the
+# frame-time governor choose, for the raster renderer only, since the other
+# renderers draw no faster at a reduced size (see FrameGovernor.levels).
+fireworks_auto_scale = options.fireworks_scale == "auto" and fireworks_renderer == "raster"
+fireworks_scale = 1.0 if options.fireworks_scale == "auto" else options.fireworks_scale
+fireworks_canvas = None  # Reduced-size surface, None at full size
+
+def set_fireworks_scale(scale):
+    # Rebuild the layers the fireworks draw into at a fraction of the screen
+    global fireworks_scale, fireworks_canvas, fade_layer, rasterizer
+    size = (max(1, round(screen_width * scale)), max(1, round(screen_height * scale)))
+    fireworks_scale = scale
+    fireworks_canvas = pygame.Surface(size).convert() if scale != 1 else None
+    fade_layer = FadeLayer(size)
+    pool, workers = rasterizer.pool, rasterizer.workers
+    rasterizer = Rasterizer(size)
+    rasterizer.pool, rasterizer.workers = pool, workers
+    particle_store.scale = scale
+
+if fireworks_scale != 1:
+    set_fireworks_scale(fireworks_scale)
+
+def rocket_radius(scale):
+    return max(1, round(3 * scale))
+
+# Firework physics constants are per step of a fixed 30 Hz simulation
+fireworks_step_hz = 30
+fireworks_max_frame_time = 0.25  # Longest stall the simulation catches up on
+fireworks_clock = None
+fireworks_accumulator = 0.0
+fireworks_frame_steps = 0.0  # Simulation steps covered by the last frame
+fireworks_steps = 0  # Simulation steps since the celebration started
+live_frame = FireworksFrame()
+
 def add_firework(firework_type=None):
-    x = random.randint(screen_width // 4, 3 * screen_width // 4)
+    x = int(fireworks_rng.integers(screen_width // 4, 3 * screen_width // 4 + 1))
     y = screen_height - 50
     fireworks.append(Firework(x, y, firework_type))
 
-def update_fireworks():
-    global firework_timer
-    
+def update_fireworks(now=None):
+    # Advance the simulation by as many fixed steps as real time allows, so
+    # the celebration moves at the same speed at any frame rate
+    global fireworks_clock, fireworks_accumulator, fireworks_frame_steps
+    now = time.perf_counter() if now is None else now
+    if fireworks_clock is None:
+        fireworks_clock = now
+    elapsed = min(now - fireworks_clock, fireworks_max_frame_time)
+    fireworks_clock = now
+    fireworks_accumulator += elapsed
+    fireworks_frame_steps = elapsed * fireworks_step_hz
+    step = 1 / fireworks_step_hz
+    while fireworks_accumulator >= step - 1e-9:
+        step_fireworks()
+        fireworks_accumulator -= step
+
+def step_fireworks():
+    global firework_timer, fireworks_steps
+    fireworks_steps += 1
+
     # Add new fireworks occasionally with variety
     firework_timer += 1
-    if firework_timer > random.randint(25, 50):
-        # Choose firework type with weighted probabilities
-        firework_types = ['brocade', 'willow', 'bee', 'palm', 'star', 'classic']
-        weights = [0.2, 0.15, 0.1, 0.2, 0.15, 0.2]  # Higher chance for more spectacular types
-        firework_type = random.choices(firework_types, weights=weights)[0]
-        add_firework(firework_type)
+    delay, pick = fireworks_rng.random(2).tolist()
+    if firework_timer > (25 + int(delay * 26)) * governor.spawn_scale:
+        # Choose firework type with the registry's weights
+        pick = min(np.searchsorted(firework_weight_edges, pick, side="right"),
+                   len(firework_types) - 1)
+        add_firework(firework_types[pick])
         firework_timer = 0
         
-    # Update existing fireworks
-    for firework in fireworks[:]:
+    # Move every live particle in one step, before new explosions add theirs
+    particle_store.step()
+
+    # Update existing fireworks, dropping finished ones in the same pass
+    live = 0
+    for firework in fireworks:
         firework.update()
-        if firework.is_finished():
-            fireworks.remove(firework)
+        if not firework.is_finished():
+            fireworks[live] = firework
+            live += 1
+    del fireworks[live:]
+
+def reset_fireworks():
+    global firework_timer, fireworks_clock, fireworks_accumulator, fireworks_steps
+    fireworks_worker.stop()
+    if celebration_cache is not None:
+        celebration_cache.restart()
+    fireworks.clear()
+    particle_store.clear()
+    fade_layer.clear()
+    rasterizer.trails.fill(0)
+    firework_timer = 0
+    fireworks_clock = None
+    fireworks_accumulator = 0.0
+    fireworks_steps = 0
 
 def draw_fireworks(screen):
-    for firework in fireworks:
-        firework.draw(screen)
+    target = screen
+    if fireworks_canvas is not None:
+        target = fireworks_canvas
+        target.fill((0, 0, 0))
+    if fireworks_worker.running:
+        # Draw the newest snapshot the simulation thread has published
+        frame = fireworks_worker.snapshots.acquire()
+        if frame is not None:
+            steps = frame.steps - fireworks_worker.drawn_steps
+            fireworks_worker.drawn_steps = frame.steps
+            render_fireworks(target, frame, steps)
+        fireworks_worker.snapshots.release()
+    else:
+        # How far between the last two simulation steps this frame falls
+        blend = min(1.0, max(0.0, fireworks_accumulator * fireworks_step_hz))
+        capture_fireworks(live_frame, blend)
+        render_fireworks(target, live_frame, fireworks_frame_steps)
+    if fireworks_canvas is not None:
+        pygame.transform.smoothscale(fireworks_canvas, screen.get_size(), screen)
+
+def capture_fireworks(frame, blend=1.0):
+    # Copy what drawing needs out of the simulation, with heads and rockets
+    # blend of the way through the current step
+    scale = particle_store.scale
+    frame.fading = particle_store.fading()
+    frame.steps = fireworks_steps
+    frame.store("fade", particle_store.circles(fade=True, blend=blend, alpha=fireworks_alpha))
+    circles = particle_store.circles(blend=blend, alpha=fireworks_alpha)
+    rockets = [firework for firework in fireworks if not firework.exploded]
+    if rockets:
+        # Rockets go first so the particles are drawn over them
+        centers = np.array([firework.position(blend, scale) for firework in rockets],
+                           dtype=np.int32)
+        rocket_circles = (centers[:, 0], centers[:, 1],
+                          np.full(len(rockets), rocket_radius(scale), dtype=np.int32),
+                          np.array([f.color for f in rockets], dtype=np.uint8),
+                          np.full(len(rockets), 255, dtype=np.uint8))
+        circles = tuple(np.concatenate((rocket, particle))
+                        for rocket, particle in zip(rocket_circles, circles))
+    frame.store("circles", circles)
+
+def render_fireworks(screen, frame, steps):
+    # steps is how far the simulation moved since the last frame drawn; a
+    # frame drawn again adds nothing more to the faded trails
+    if fireworks_renderer == "raster":
+        # Faded trails, point trails and rockets all splat into one buffer
+        keep = fade_layer.advance(frame.fading, steps)
+        fade_circles = premultiplied(frame.fade) if keep is not None and steps else None
+        rasterizer.draw(screen, premultiplied(frame.circles), fade_circles, keep)
+        return
+
+    # Faded trails first, so everything else is drawn over them
+    if fade_layer.begin(frame.fading, steps):
+        if steps:
+            draw_circles(fade_layer.surface, frame.fade)
+        screen.blit(fade_layer.surface, (0, 0))
+    draw_circles(screen, frame.circles)
+
+# Runs the celebration on its own thread (--sim-thread), so a heavy step
+# can't hold up the timer text or event handling. The main loop only ever
+# draws the newest complete snapshot.
+class FireworksWorker:
+    def __init__(self):
+        self.snapshots = SnapshotBuffer()
+        self.thread = None
+        self.running = False
+        self.drawn_steps = 0    # Steps of the snapshot drawn last
+        self.trail_cap = None   # Governor trail cap waiting to be applied
+
+    def start(self):
+        if self.running:
+            return
+        self.snapshots = SnapshotBuffer()
+        self.drawn_steps = fireworks_steps
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        period = 1 / fireworks_step_hz
+        due = time.perf_counter()
+        while self.running:
+            if self.trail_cap is not None:
+                particle_store.cap_trails(self.trail_cap)
+                self.trail_cap = None
+            step_fireworks()
+            capture_fireworks(self.snapshots.back_frame())
+            self.snapshots.publish()
+            due += period
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -fireworks_max_frame_time:
+                # Too far behind to catch up, slow down instead
+                due = time.perf_counter()
+
+fireworks_threaded = options.sim_thread
+fireworks_worker = FireworksWorker()
+
+# The finish celebration is only decoration, so it can be recorded once with
+# python lap-timer23.py --bake and replayed from disk instead of simulated.
+# Each frame is stored as the pixels that changed since the frame before,
+# zlib-compressed.
+class CelebrationCache:
+    def __init__(self, key, size, fps):
+        self.key = key  # See celebration_key
+        self.size = size
+        self.fps = fps
+        self.blobs = []   # One compressed delta per frame
+        self.counts = []  # Changed pixels in each delta
+        self.pixels = np.zeros((size[0] * size[1], 3), dtype=np.uint8)
+        self.frame = -1       # Last frame decoded into pixels
+        self.started = None   # When replay began
+
+    def record(self, surface):
+        pixels = pygame.surfarray.array3d(surface).reshape(-1, 3)
+        changed = np.flatnonzero((pixels != self.pixels).any(axis=1))
+        self.blobs.append(zlib.compress(changed.astype(np.uint32).tobytes() +
+                                        pixels[changed].tobytes()))
+        self.counts.append(len(changed))
+        self.pixels[changed] = pixels[changed]
+
+    def save(self, path):
+        np.savez(path, key=np.array(self.key), size=np.array(self.size), fps=np.array(self.fps),
+                 counts=np.array(self.counts, dtype=np.int64),
+                 lengths=np.array([len(blob) for blob in self.blobs], dtype=np.int64),
+                 data=np.frombuffer(b"".join(self.blobs), dtype=np.uint8))
+
+    def restart(self):
+        self.pixels.fill(0)
+        self.frame = -1
+        self.started = None
+
+    def apply(self, frame):
+        count = self.counts[frame]
+        data = zlib.decompress(self.blobs[frame])
+        changed = np.frombuffer(data, dtype=np.uint32, count=count)
+        self.pixels[changed] = np.frombuffer(data, dtype=np.uint8, offset=4 * count).reshape(-1, 3)
+
+    def draw(self, screen, now=None):
+        # Replay the recording in real time, looping at the end
+        now = time.perf_counter() if now is None else now
+        if self.started is None:
+            self.started = now
+        frame = int((now - self.started) * self.fps) % len(self.blobs)
+        if frame < self.frame:
+            self.restart()
+            self.started = now - frame / self.fps
+        while self.frame < frame:
+            self.frame += 1
+            self.apply(self.frame)
+        pygame.surfarray.blit_array(screen, self.pixels.reshape(self.size + (3,)))
+
+def load_celebration(path, key):
+    # The cached celebration, or None when there is none for this key
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as archive:
+        if str(archive["key"]) != key:
+            return None
+        cache = CelebrationCache(key, tuple(archive["size"].tolist()), int(archive["fps"]))
+        cache.counts = archive["counts"].tolist()
+        data = archive["data"].tobytes()
+        ends = np.cumsum(archive["lengths"]).tolist()
+    cache.blobs = [data[start:end] for start, end in zip([0] + ends[:-1], ends)]
+    return cache
+
+def celebration_key():
+    # A cache only matches the screen, renderer settings and firework types
+    # it was baked with
+    registry = hashlib.sha1(repr(firework_registry).encode()).hexdigest()[:16]
+    return (f"{screen_width}x{screen_height} {fireworks_renderer} {fireworks_scale:g} "
+            f"{'alpha' if fireworks_alpha else 'opaque'} {registry}")
+
+celebration_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                      "celebration-cache.npz")
+celebration_seconds = 20  # Length of the baked loop
+celebration_cache = None
+
+def fireworks_stats():
+    return {
+        **governor.budget(),
+        "fireworks_scale": fireworks_scale,
+        "particles": particle_store.count,
+        "particles_per_second": round(particle_store.rate()),
+        "pool_hits": particle_store.pool_hits,
+        "pool_misses": particle_store.pool_misses,
+        "pool_peak": particle_store.peak,
+        "pool_capacity": particle_store.capacity,
+        "pool_dropped": particle_store.dropped,
+        "culled": particle_store.culled,
+        "cull_frames_saved": particle_store.frames_saved,
+        "sprite_hits": sprite_cache.hits,
+        "sprite_misses": sprite_cache.misses,
+        "sprites": len(sprite_cache.sprites),
+        "sprite_bytes": sprite_cache.memory(),
+    }
 
 # === State ===
 started = False
@@ -329,6 +1400,104 @@ input_stage = "laps"  # 'laps' -> 'length' -> 'done'
 length_input_text = ""
 length_input_mode = "buttons"  # 'buttons' or 'text'
 
+# === Text Cache ===
+# Rendered text, so labels are only rendered again when their text or color
+# changes. Bounded by an LRU since the timer makes a new string every second.
+class TextCache:
+    def __init__(self, max_surfaces=128):
+        self.max_surfaces = max_surfaces
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        # (surface, rect) with the rect at the origin
+        key = (font, text, antialias, color)
+        entry = self.surfaces.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return entry
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        # Antialiased text keeps its per-pixel alpha, plain text its colorkey
+        surface = surface.convert_alpha() if antialias else surface.convert()
+        entry = self.surfaces[key] = (surface, surface.get_rect())
+        if len(self.surfaces) > self.max_surfaces:
+            self.surfaces.popitem(last=False)
+        return entry
+
+    def centered(self, font, text, antialias, color, center):
+        # Surface and the rect that centers it on center
+        surface, rect = self.render(font, text, antialias, color)
+        return surface, rect.move(center[0] - rect.centerx, center[1] - rect.centery)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "text_hits": self.hits,
+            "text_misses": self.misses,
+            "text_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "text_surfaces": len(self.surfaces),
+            "text_bytes": sum(surface.get_width() * surface.get_height() * surface.get_bytesize()
+                              for surface, rect in self.surfaces.values()),
+        }
+
+text_cache = TextCache()
+
+# === Glyph Atlas ===
+# Digits, colon and label prefixes of the clock and lap counters, rendered
+# once per font and color. Digits all advance by the widest digit's width, so
+# the numbers don't jitter as they change, and updating them never renders.
+glyph_prefixes = ("Time: ", "Laps Remaining: ", "Completed Laps: ", "Total Laps: ")
+
+class GlyphAtlas:
+    def __init__(self, font, color):
+        self.font = font
+        self.color = color
+        self.glyphs = {}
+        for text in "0123456789:":
+            self.glyph(text)
+        for prefix in glyph_prefixes:
+            self.glyph(prefix)
+        self.advance = max(self.glyphs[digit].get_width() for digit in "0123456789")
+        self.height = max(glyph.get_height() for glyph in self.glyphs.values())
+
+    def glyph(self, text):
+        # Anything outside the atlas, like a minus sign, is added on first use
+        glyph = self.glyphs.get(text)
+        if glyph is None:
+            glyph = self.glyphs[text] = text_cache.render(self.font, text, True, self.color)[0]
+        return glyph
+
+    def pieces(self, text):
+        # A known prefix as one glyph, then one glyph per character
+        prefix = next((prefix for prefix in glyph_prefixes if text.startswith(prefix)), "")
+        return ([prefix] if prefix else []) + list(text[len(prefix):])
+
+    def draw(self, screen, text, center):
+        # Draw text centered on center and return the rect it covers
+        pieces = self.pieces(text)
+        widths = [self.advance if piece.isdigit() else self.glyph(piece).get_width()
+                  for piece in pieces]
+        rect = pygame.Rect(0, 0, sum(widths), self.height)
+        rect.center = center
+        x = rect.x
+        for piece, width in zip(pieces, widths):
+            glyph = self.glyph(piece)
+            # Digits sit in the middle of their fixed-width cell
+            screen.blit(glyph, (x + (width - glyph.get_width()) // 2, rect.y))
+            x += width
+        return rect
+
+glyph_atlases = {}
+
+def glyph_atlas(font, color):
+    atlas = glyph_atlases.get((font, color))
+    if atlas is None:
+        atlas = glyph_atlases[font, color] = GlyphAtlas(font, color)
+    return atlas
+
 # === UI Buttons ===
 # Top control buttons
 button_width = 160
@@ -385,69 +1554,164 @@ for i, (value, label) in enumerate(length_values):
     rect = pygame.Rect(x, length_buttons_y, length_button_width, length_button_height)
     length_selection_buttons.append((rect, value, label))
 
-def draw_display(elapsed_time, laps_left, finished):
-    screen.fill((0, 0, 0))
-    global flash_start_time
+# === Background Layers ===
+# The fixed chrome of each screen (buttons, borders, prompts) drawn once into
+# a display-format surface, so a frame starts with a single blit
+background_layers = {}
 
-    # Draw fireworks in background if finished
-    if finished:
-        update_fireworks()
-        draw_fireworks(screen)
+def background_key(finished):
+    if input_stage == "laps":
+        return ("laps",)
+    if input_stage == "length":
+        return ("length", length_input_mode)
+    return ("finished",) if finished else ("running",)
+
+def background_layer(key):
+    layer = background_layers.get(key)
+    if layer is None:
+        layer = background_layers[key] = pygame.Surface((screen_width, screen_height)).convert()
+        layer.fill((0, 0, 0))
+        draw_chrome(layer, key)
+    return layer
 
+def draw_chrome(screen, key):
     # Reset and Quit buttons
     pygame.draw.rect(screen, (100, 100, 255), reset_button_rect)
-    reset_text = font_large.render("Reset", True, (255, 255, 255))
-    reset_text_rect = reset_text.get_rect(center=reset_button_rect.center)
+    reset_text, reset_text_rect = text_cache.centered(font_large, "Reset", True, (255, 255, 255), reset_button_rect.center)
     screen.blit(reset_text, reset_text_rect)
 
     pygame.draw.rect(screen, (200, 50, 50), quit_button_rect)
-    quit_text = font_large.render("Quit", True, (255, 255, 255))
-    quit_text_rect = quit_text.get_rect(center=quit_button_rect.center)
+    quit_text, quit_text_rect = text_cache.centered(font_large, "Quit", True, (255, 255, 255), quit_button_rect.center)
     screen.blit(quit_text, quit_text_rect)
 
-    if input_stage == "laps":
+    if key == ("laps",):
         # Display lap selection buttons
-        prompt_surface = font_large.render("Select number of laps:", True, (255, 255, 255))
-        prompt_rect = prompt_surface.get_rect(center=(screen_width // 2, (screen_height // 6)+50))
+        prompt_surface, prompt_rect = text_cache.centered(font_large, "Select number of laps:", True, (255, 255, 255), (screen_width // 2, (screen_height // 6)+50))
         screen.blit(prompt_surface, prompt_rect)
         
         for rect, value in lap_selection_buttons:
             pygame.draw.rect(screen, (0, 150, 200), rect)
             pygame.draw.rect(screen, (255, 255, 255), rect, 3)
             
-            text_surface = font_large.render(str(value), True, (255, 255, 255))
-            text_rect = text_surface.get_rect(center=rect.center)
+            text_surface, text_rect = text_cache.centered(font_large, str(value), True, (255, 255, 255), rect.center)
             screen.blit(text_surface, text_rect)
             
-    elif input_stage == "length":
-        if length_input_mode == "buttons":
-            # Display length selection buttons
-            prompt_surface = font_large.render("Select lap length:", True, (255, 255, 255))
-            prompt_rect = prompt_surface.get_rect(center=(screen_width // 2, (screen_height // 6)+50))
-            screen.blit(prompt_surface, prompt_rect)
+    elif key == ("length", "buttons"):
+        # Display length selection buttons
+        prompt_surface, prompt_rect = text_cache.centered(font_large, "Select lap length:", True, (255, 255, 255), (screen_width // 2, (screen_height // 6)+50))
+        screen.blit(prompt_surface, prompt_rect)
+        
+        for rect, value, label in length_selection_buttons:
+            pygame.draw.rect(screen, (0, 150, 200), rect)
+            pygame.draw.rect(screen, (255, 255, 255), rect, 3)
             
-            for rect, value, label in length_selection_buttons:
-                pygame.draw.rect(screen, (0, 150, 200), rect)
-                pygame.draw.rect(screen, (255, 255, 255), rect, 3)
-                
-                text_surface = font_large.render(label, True, (255, 255, 255))
-                text_rect = text_surface.get_rect(center=rect.center)
-                screen.blit(text_surface, text_rect)
+            text_surface, text_rect = text_cache.centered(font_large, label, True, (255, 255, 255), rect.center)
+            screen.blit(text_surface, text_rect)
+
+    elif key == ("length", "text"):
+        # Text input for custom length, the typed text goes between these
+        prompt_surface, prompt_rect = text_cache.centered(font_large, "Enter lap length (m):", True, (255, 255, 255), (screen_width // 2, screen_height // 4))
+        screen.blit(prompt_surface, prompt_rect)
+
+        instruction_surface, instruction_rect = text_cache.centered(font_medium, "Press Enter to confirm", True, (200, 200, 200), (screen_width // 2, screen_height // 2 + 100))
+        screen.blit(instruction_surface, instruction_rect)
+
+    elif key == ("running",):
+        # Control buttons
+        pygame.draw.rect(screen, (0, 100, 200), start_button_rect)
+        start_text, start_text_rect = text_cache.centered(font_large, "Start", True, (255, 255, 255), start_button_rect.center)
+        screen.blit(start_text, start_text_rect)
+
+        pygame.draw.rect(screen, (200, 150, 50), pause_button_rect)
+        pause_text, pause_text_rect = text_cache.centered(font_large, "Pause", True, (255, 255, 255), pause_button_rect.center)
+        screen.blit(pause_text, pause_text_rect)
+
+        pygame.draw.rect(screen, (0, 200, 100), lap_button_rect)
+        lap_text, lap_text_rect = text_cache.centered(font_large, "+ Lap", True, (255, 255, 255), lap_button_rect.center)
+        screen.blit(lap_text, lap_text_rect)
+
+        pygame.draw.rect(screen, (200, 100, 0), minus_lap_button_rect)
+        minus_lap_text, minus_lap_text_rect = text_cache.centered(font_large, "- Lap", True, (255, 255, 255), minus_lap_button_rect.center)
+        screen.blit(minus_lap_text, minus_lap_text_rect)
+
+# === Dirty Rectangles ===
+# Between stage changes only the text widgets differ from frame to frame, so
+# only their rectangles are pushed to the display instead of a full flip
+drawn_widgets = {}   # Widget name -> (surface, rect) drawn this frame
+shown_widgets = {}   # The same for the frame on the display
+shown_key = None     # Background layer on the display
+display_flips = 0
+display_updates = 0
+display_update_pixels = 0
+
+def blit_widget(name, surface, rect):
+    screen.blit(surface, rect)
+    drawn_widgets[name] = (surface, rect)
+
+def glyph_widget(name, font, text, color, center):
+    # A clock or counter composed from the glyph atlas
+    rect = glyph_atlas(font, color).draw(screen, text, center)
+    drawn_widgets[name] = ((font, text, color), rect)
+
+def present_display(key, full=False):
+    # Flip when the whole screen may have changed, otherwise update the
+    # old and new rects of every widget that changed. Cached text surfaces
+    # are shared, so the same text in the same place is the same surface;
+    # glyph widgets compare their font, text and color.
+    global shown_key, shown_widgets, drawn_widgets, display_flips, display_updates
+    global display_update_pixels
+    if full or key != shown_key:
+        pygame.display.flip()
+        display_flips += 1
+    else:
+        rects = []
+        for name in drawn_widgets.keys() | shown_widgets.keys():
+            old = shown_widgets.get(name)
+            new = drawn_widgets.get(name)
+            if old is None or new is None or old[0] != new[0] or old[1] != new[1]:
+                rects += [widget[1] for widget in (old, new) if widget is not None]
+        if rects:
+            pygame.display.update(rects)
+            display_updates += 1
+            display_update_pixels += sum(rect.width * rect.height for rect in rects)
+    shown_key = key
+    shown_widgets, drawn_widgets = drawn_widgets, shown_widgets
+
+def display_stats():
+    return {
+        "display_skips": display_skips,
+        "display_flips": display_flips,
+        "display_updates": display_updates,
+        "display_update_pixels": display_update_pixels,
+    }
+
+def draw_display(elapsed_time, laps_left, finished):
+    key = background_key(finished)
+    drawn_widgets.clear()
+
+    if finished:
+        # Fireworks in the background, with only the buttons of the finished
+        # screen's layer copied over them
+        screen.fill((0, 0, 0))
+        if celebration_cache is not None:
+            celebration_cache.draw(screen)
         else:
-            # Display text input for custom length
-            prompt_surface = font_large.render("Enter lap length (m):", True, (255, 255, 255))
-            prompt_rect = prompt_surface.get_rect(center=(screen_width // 2, screen_height // 4))
-            screen.blit(prompt_surface, prompt_rect)
-            
-            input_surface = font_huge.render(length_input_text, True, (255, 255, 100))
-            input_rect = input_surface.get_rect(center=(screen_width // 2, screen_height // 2))
-            screen.blit(input_surface, input_rect)
-            
-            instruction_surface = font_medium.render("Press Enter to confirm", True, (200, 200, 200))
-            instruction_rect = instruction_surface.get_rect(center=(screen_width // 2, screen_height // 2 + 100))
-            screen.blit(instruction_surface, instruction_rect)
-        
+            if fireworks_threaded:
+                fireworks_worker.start()
+            else:
+                update_fireworks()
+            draw_fireworks(screen)
+        layer = background_layer(key)
+        for rect in (reset_button_rect, quit_button_rect):
+            screen.blit(layer, rect, rect)
     else:
+        screen.blit(background_layer(key), (0, 0))
+
+    if input_stage == "length" and length_input_mode == "text":
+        input_surface, input_rect = text_cache.centered(font_huge, length_input_text, True, (255, 255, 100), (screen_width // 2, screen_height // 2))
+        blit_widget("input", input_surface, input_rect)
+
+    elif input_stage not in ("laps", "length"):
         # Timer display area
         timer_y = (screen_height // 8)+75
         
@@ -457,67 +1721,36 @@ def draw_display(elapsed_time, laps_left, finished):
         seconds = int(elapsed_time) % 60
         time_str = f"{hours:02}:{minutes:02}:{seconds:02}"
         
-        time_surface = font_huge.render(f"Time: {time_str}", True, (255, 255, 255))
-        time_rect = time_surface.get_rect(center=(screen_width // 2, timer_y))
-        screen.blit(time_surface, time_rect)
+        glyph_widget("time", font_huge, f"Time: {time_str}", (255, 255, 255), (screen_width // 2, timer_y))
 
         # Status display area
         status_y = (screen_height // 3)+50
         
         if finished:
-            laps_surface = font_huge.render(f"Total Laps: {total_laps}", True, (255, 200, 200))
-            laps_rect = laps_surface.get_rect(center=(screen_width // 2, status_y))
-            screen.blit(laps_surface, laps_rect)
+            glyph_widget("total_laps", font_huge, f"Total Laps: {total_laps}", (255, 200, 200), (screen_width // 2, status_y))
             
-            congrats_surface = font_huge.render("Congratulations!!!", True, (100, 255, 100))
-            congrats_rect = congrats_surface.get_rect(center=(screen_width // 2, status_y + 80))
-            screen.blit(congrats_surface, congrats_rect)
+            congrats_surface, congrats_rect = text_cache.centered(font_huge, "Congratulations!!!", True, (100, 255, 100), (screen_width // 2, status_y + 80))
+            blit_widget("congrats", congrats_surface, congrats_rect)
             
             distance = total_laps * lap_length_m
-            distance_surface = font_huge.render(f"Distance: {distance:.2f} m", True, (200, 255, 200))
-            distance_rect = distance_surface.get_rect(center=(screen_width // 2, status_y + 140))
-            screen.blit(distance_surface, distance_rect)
+            distance_surface, distance_rect = text_cache.centered(font_huge, f"Distance: {distance:.2f} m", True, (200, 255, 200), (screen_width // 2, status_y + 140))
+            blit_widget("distance", distance_surface, distance_rect)
         else:
             flash_color = (255, 200, 200)  # Default
 
-            if flash_start_time and (time.time() - flash_start_time < flash_duration):
-              if int((time.time() - flash_start_time) * 4) % 2 == 0:
+            phase = flash_phase()
+            if phase is not None:
+              if phase % 2 == 0:
                 flash_color = (255, 255, 255)  # White
               else:
                 flash_color = (100, 100, 255)  # Blue
-            else:
-              flash_start_time = None  # Reset after flashing
-            laps_remaining_surface = font_huge2.render(f"Laps Remaining: {laps_left}", True, flash_color)
-            laps_remaining_rect = laps_remaining_surface.get_rect(center=(screen_width // 2, status_y))
-            screen.blit(laps_remaining_surface, laps_remaining_rect)
+            glyph_widget("laps_remaining", font_huge2, f"Laps Remaining: {laps_left}", flash_color, (screen_width // 2, status_y))
             
             completed_laps = total_laps - remaining_laps
-            completed_surface = font_huge.render(f"Completed Laps: {completed_laps}", True, (200, 255, 255))
-            completed_rect = completed_surface.get_rect(center=(screen_width // 2, status_y + 80))
-            screen.blit(completed_surface, completed_rect)
-
-            # Control buttons
-            pygame.draw.rect(screen, (0, 100, 200), start_button_rect)
-            start_text = font_large.render("Start", True, (255, 255, 255))
-            start_text_rect = start_text.get_rect(center=start_button_rect.center)
-            screen.blit(start_text, start_text_rect)
-
-            pygame.draw.rect(screen, (200, 150, 50), pause_button_rect)
-            pause_text = font_large.render("Pause", True, (255, 255, 255))
-            pause_text_rect = pause_text.get_rect(center=pause_button_rect.center)
-            screen.blit(pause_text, pause_text_rect)
-
-            pygame.draw.rect(screen, (0, 200, 100), lap_button_rect)
-            lap_text = font_large.render("+ Lap", True, (255, 255, 255))
-            lap_text_rect = lap_text.get_rect(center=lap_button_rect.center)
-            screen.blit(lap_text, lap_text_rect)
+            glyph_widget("completed", font_huge, f"Completed Laps: {completed_laps}", (200, 255, 255), (screen_width // 2, status_y + 80))
 
-            pygame.draw.rect(screen, (200, 100, 0), minus_lap_button_rect)
-            minus_lap_text = font_large.render("- Lap", True, (255, 255, 255))
-            minus_lap_text_rect = minus_lap_text.get_rect(center=minus_lap_button_rect.center)
-            screen.blit(minus_lap_text, minus_lap_text_rect)
-
-    pygame.display.flip()
+    # The celebration changes the whole screen every frame
+    present_display(key, full=finished)
 
 def handle_start():
     global started, start_time, paused, pause_time
@@ -554,7 +1787,7 @@ def handle_minus_lap():
         remaining_laps += 2
 
 def handle_reset():
-    global started, done, start_time, elapsed_time, remaining_laps, paused, input_stage, length_input_text, length_input_mode, fireworks
+    global started, done, start_time, elapsed_time, remaining_laps, paused, input_stage, length_input_text, length_input_mode, fireworks, flash_start_time
     started = False
     paused = False
     done = False
@@ -564,7 +1797,8 @@ def handle_reset():
     input_stage = "laps"
     length_input_text = ""
     length_input_mode = "buttons"
-    fireworks.clear()  # Clear any existing fireworks
+    flash_start_time = None
+    reset_fireworks()  # Clear any existing fireworks
 
 def select_laps(num_laps):
     global remaining_laps, total_laps, input_stage
@@ -583,7 +1817,14 @@ def select_length(length_value):
         input_stage = "done"
 
 # GPIO handler
+# Presses arrive on gpiozero's thread, so they are handed to the main loop
+# as an event, which also wakes it from pygame.event.wait
+GPIO_PRESS = pygame.event.custom_type()
+
 def gpio_handler():
+    pygame.event.post(pygame.event.Event(GPIO_PRESS))
+
+def handle_gpio_press():
     if not started:
         handle_start()
     else:
@@ -591,10 +1832,532 @@ def gpio_handler():
 
 start_lap_button.when_pressed = gpio_handler
 
+# === Redraw Scheduling ===
+# Outside the celebration the screen only changes when the clock ticks over
+# a second, the lap counter flashes, or input arrives. The main loop compares
+# what would be shown against what is shown and sleeps in between.
+shown_view = None
+display_skips = 0  # Loop passes that had nothing new to draw
+
+def flash_phase():
+    # Quarter-second phase of the lap flash, None when not flashing. An
+    # expired flash is cleared here, whichever screen is showing.
+    global flash_start_time
+    if flash_start_time is None:
+        return None
+    flashing = time.time() - flash_start_time
+    if flashing >= flash_duration:
+        flash_start_time = None  # Reset after flashing
+        return None
+    return int(flashing * 4)
+
+def view_model(elapsed_time, laps_left, finished):
+    # Everything draw_display shows, except the fireworks
+    return (input_stage, length_input_mode, length_input_text, int(elapsed_time), laps_left,
+            total_laps, remaining_laps, lap_length_m, finished, flash_phase())
+
+def redraw_timeout():
+    # Milliseconds until the next visible change that isn't input, or None
+    # while the fireworks need every frame
+    if done:
+        return None
+    waits = [1000]
+    if started and not paused:
+        waits.append((1 - (time.time() - start_time) % 1) * 1000)
+    if flash_phase() is not None:
+        flashing = time.time() - flash_start_time
+        waits.append((0.25 - flashing % 0.25) * 1000)
+    return max(1, math.ceil(min(waits)) + 1)
+
+# === Benchmarks ===
+# Run with: python lap-timer23.py --benchmark
+class ReferenceParticle:
+    # The per-object particle the store replaced, kept for comparison
+    def __init__(self, x, y, vx, vy, color, life, trail_length=5, gravity=0.1, size=3):
+        self.x, self.y, self.vx, self.vy = x, y, vx, vy
+        self.color = color
+        self.life = self.max_life = life
+        self.gravity = gravity
+        self.size = size
+        self.trail = []
+        self.trail_length = trail_length
+
+    def update(self):
+        self.trail.append((self.x, self.y))
+        if len(self.trail) > self.trail_length:
+            self.trail.pop(0)
+        self.x += self.vx
+        self.y += self.vy
+        self.vy += self.gravity
+        self.life -= 1
+        self.vx *= 0.995
+        self.vy *= 0.995
+
+    def draw(self, screen):
+        size = max(1, int(self.size * (self.life / self.max_life)))
+        for i, (tx, ty) in enumerate(self.trail):
+            trail_size = max(1, int(size * (i / len(self.trail))))
+            trail_color = tuple(max(0, min(255, c - 50)) for c in self.color)
+            pygame.draw.circle(screen, trail_color, (int(tx), int(ty)), trail_size)
+        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), size)
+
+def brocade_burst(bursts=8, life=1000):
+    # Concurrent brocade bursts, as on the finish screen, with lives long
+    # enough that nothing dies during a benchmark
+    particle_store.clear()
+    for i in range(bursts):
+        x = screen_width * (i + 1) // (bursts + 1)
+        Firework(x, screen_height // 3, 'brocade').explode()
+    n = particle_store.count
+    burst = [(float(particle_store.x[j]), float(particle_store.y[j]), float(particle_store.vx[j]),
+              float(particle_store.vy[j]), tuple(particle_store.color[j].tolist()), life,
+              int(particle_store.trail_length[j]), float(particle_store.gravity[j]),
+              float(particle_store.size[j])) for j in range(n)]
+    particle_store.clear()
+    return burst
+
+def store_from(burst):
+    store = ParticleStore()
+    for x, y, vx, vy, color, life, trail_length, gravity, size in burst:
+        store.spawn(x, y, [vx], [vy], [color], [life], trail_length=trail_length,
+                    gravity=gravity, size=size, sparkle_chance=0)
+    return store
+
+def bench_particle_step():
+    burst = brocade_burst()
+    objects = [ReferenceParticle(*args) for args in burst]
+    frames = 60
+    started = time.perf_counter()
+    for _ in range(frames):
+        for particle in objects:
+            particle.update()
+    object_rate = len(burst) * frames / (time.perf_counter() - started)
+
+    store = store_from(burst)
+    for _ in range(frames):
+        store.step()
+    print(f"particle step: {len(burst)} particles, per-object {object_rate:,.0f}/s, "
+          f"store {store.rate():,.0f}/s")
+
+def bench_brocade_frames():
+    # Full update + draw of brocade-heavy frames with 20-point trails
+    burst = brocade_burst()
+    surface = pygame.Surface((screen_width, screen_height))
+    frames = 60
+
+    objects = [ReferenceParticle(*args) for args in burst]
+    started = time.perf_counter()
+    for _ in range(frames):
+        surface.fill((0, 0, 0))
+        for particle in objects:
+            particle.update()
+            particle.draw(surface)
+    before = (time.perf_counter() - started) / frames
+
+    store = store_from(burst)
+    started = time.perf_counter()
+    for _ in range(frames):
+        surface.fill((0, 0, 0))
+        store.step()
+        store.draw(surface)
+    after = (time.perf_counter() - started) / frames
+    print(f"brocade frames: {len(burst)} particles, list trails {before * 1000:.2f} ms/frame, "
+          f"ring trails {after * 1000:.2f} ms/frame")
+
+def bench_renderers():
+    # Same brocade-heavy frames drawn by each fireworks renderer, for a
+    # finish-screen load and for a much heavier one
+    global fireworks_renderer, fireworks_sort_sprites
+    surface = pygame.Surface((screen_width, screen_height)).convert()
+    defaults = fireworks_renderer, fireworks_sort_sprites
+    for bursts, frames in ((8, 60), (64, 15)):
+        burst = brocade_burst(bursts)
+        results = []
+        for renderer, sort_sprites, label in (("circles", False, "circles"),
+                                              ("sprites", False, "blits"),
+                                              ("sprites", True, "sorted blits"),
+                                              ("raster", False, "raster")):
+            fireworks_renderer, fireworks_sort_sprites = renderer, sort_sprites
+            store = store_from(burst)
+            started = time.perf_counter()
+            for _ in range(frames):
+                surface.fill((0, 0, 0))
+                store.step()
+                store.draw(surface)
+            results.append(f"{label} {(time.perf_counter() - started) / frames * 1000:.2f} ms/frame")
+        print(f"renderers: {len(burst)} particles, " + ", ".join(results))
+    fireworks_renderer, fireworks_sort_sprites = defaults
+    print(f"renderers: {sprite_cache.hits} sprite hits, {sprite_cache.misses} misses")
+
+def bench_alpha():
+    # Opaque particles against alpha-faded ones, for each renderer
+    global fireworks_renderer
+    surface = pygame.Surface((screen_width, screen_height)).convert()
+    default = fireworks_renderer
+    for bursts, frames in ((8, 60), (64, 15)):
+        burst = brocade_burst(bursts)
+        results = []
+        for renderer in ("sprites", "raster", "circles"):
+            fireworks_renderer = renderer
+            timings = []
+            for alpha in (False, True):
+                store = store_from(burst)
+                started = time.perf_counter()
+                for _ in range(frames):
+                    surface.fill((0, 0, 0))
+                    store.step()
+                    draw_circles(surface, store.circles(alpha=alpha))
+                timings.append((time.perf_counter() - started) / frames * 1000)
+            results.append(f"{renderer} opaque {timings[0]:.2f} ms, alpha {timings[1]:.2f} ms")
+        print(f"alpha: {len(burst)} particles, " + ", ".join(results))
+    fireworks_renderer = default
+
+def bench_render_scale():
+    # A heavy celebration drawn at reduced sizes and scaled up to the screen
+    global particle_store, fireworks_renderer
+    surface = pygame.Surface((screen_width, screen_height)).convert()
+    defaults = particle_store, fireworks_renderer, fireworks_scale
+    burst = brocade_burst(32)
+    frames = 15
+    for renderer in ("sprites", "raster"):
+        fireworks_renderer = renderer
+        results = []
+        for scale in (1.0, 0.75, 0.5):
+            particle_store = store_from(burst)
+            set_fireworks_scale(scale)
+            started = time.perf_counter()
+            for _ in range(frames):
+                surface.fill((0, 0, 0))
+                particle_store.step()
+                draw_fireworks(surface)
+            results.append(f"{scale:g} {(time.perf_counter() - started) / frames * 1000:.2f} ms")
+        print(f"render scale: {len(burst)} particles, {renderer} " + ", ".join(results))
+    particle_store, fireworks_renderer, scale = defaults
+    set_fireworks_scale(scale)
+
+def bench_workers():
+    # Raster frames of a heavy celebration with 1 to 4 worker threads
+    global fireworks_renderer
+    burst = brocade_burst(128)
+    surface = pygame.Surface((screen_width, screen_height)).convert()
+    default_renderer = fireworks_renderer
+    fireworks_renderer = "raster"
+    frames = 15
+    results = []
+    single = None
+    for workers in (1, 2, 3, 4):
+        store = store_from(burst)
+        set_fireworks_workers(workers, [store])
+        started = time.perf_counter()
+        for _ in range(frames):
+            store.step()
+            store.draw(surface)
+        frame_time = (time.perf_counter() - started) / frames
+        single = single or frame_time
+        results.append(f"{workers} {frame_time * 1000:.2f} ms ({single / frame_time:.2f}x)")
+    set_fireworks_workers(fireworks_workers)
+    fireworks_renderer = default_renderer
+    print(f"workers: {len(burst)} particles, " + ", ".join(results))
+
+def bench_analytic():
+    # Stepping and drawing brocade bursts, integrated versus closed form
+    burst = brocade_burst()
+    results = []
+    for analytic in (False, True):
+        store = store_from(burst)
+        store.analytic[:store.count] = analytic
+        frames = 60
+        step_time = draw_time = 0.0
+        for _ in range(frames):
+            started = time.perf_counter()
+            store.step()
+            step_time += time.perf_counter() - started
+            started = time.perf_counter()
+            store.circles()
+            draw_time += time.perf_counter() - started
+        label = "analytic" if analytic else "integrated"
+        results.append(f"{label} step {step_time / frames * 1000:.3f} ms + "
+                       f"circles {draw_time / frames * 1000:.3f} ms")
+    print(f"trajectories: {len(burst)} particles, " + ", ".join(results))
+
+def trig_explosion(firework):
+    # The explosions as the create_* methods did them before the templates:
+    # a trig call and random draws for every particle of every burst
+    firework.exploded = True
+    for spec in firework_registry[firework.firework_type]['bursts']:
+        palette = spec.get('palette')
+        vxs, vys, lives, colors = [], [], [], []
+
+        def add(angle, speed):
+            vxs.append(math.cos(angle) * speed)
+            vys.append(math.sin(angle) * speed - spec.get('lift', 0))
+            lives.append(random.randint(*spec['life']))
+            colors.append(random.choice(palette) if palette else firework.color)
+
+        if 'rays' in spec:
+            low, high = spec['speed']
+            for ray in range(spec['rays']):
+                base_angle = (ray / spec['rays']) * 2 * math.pi
+                for p in range(spec['per_ray']):
+                    angle = base_angle
+                    if 'jitter' in spec:
+                        angle += random.uniform(-spec['jitter'], spec['jitter'])
+                    speed = low if low == high else random.uniform(low, high)
+                    add(angle, speed + p * spec.get('ray_speed', 0))
+        else:
+            spread = spec.get('spread', (0, 2 * math.pi))
+            for _ in range(random.randint(*spec['count'])):
+                add(random.uniform(*spread), random.uniform(*spec['speed']))
+        firework.emit(vxs, vys, colors, lives, **spawn_options(spec))
+
+def finish_race():
+    # Time handle_lap on the last lap and the step where its four
+    # fireworks burst together
+    global started, paused, done, remaining_laps, firework_timer
+    reset_fireworks()
+    started, paused, done, remaining_laps = True, False, False, 2
+    started_at = time.perf_counter()
+    handle_lap()
+    for firework in fireworks:
+        firework.fuse = 1
+    firework_timer = 0
+    step_fireworks()
+    return time.perf_counter() - started_at
+
+def bench_explosions():
+    # Four fireworks bursting in the same frame, as at the end of a race
+    global started, done, remaining_laps, flash_start_time
+    templates = Firework.explode
+    results = []
+    for label, explode in (("per-particle trig", trig_explosion), ("templates", templates)):
+        Firework.explode = explode
+        times = [finish_race() for _ in range(200)]
+        results.append(f"{label} mean {sum(times) / len(times) * 1000:.3f} ms, "
+                       f"worst {max(times) * 1000:.3f} ms")
+    Firework.explode = templates
+    reset_fireworks()
+    started, done, remaining_laps, flash_start_time = False, False, total_laps, None
+    print("explosions: handle_lap finishing with 4 bursts, " + ", ".join(results))
+
+def bench_compaction():
+    # Half the particles die in the same frame, as clustered lifetimes do
+    for n in (1000, 10000):
+        objects = [ReferenceParticle(0.0, 0.0, 1.0, 1.0, (255, 215, 0), i % 2) for i in range(n)]
+        started = time.perf_counter()
+        for particle in objects[:]:
+            if particle.life <= 0:
+                objects.remove(particle)
+        list_remove = time.perf_counter() - started
+
+        store = ParticleStore(capacity=n, high_water=n)
+        store.spawn(0.0, 0.0, np.ones(n), np.ones(n), (255, 215, 0), np.arange(n) % 2)
+        started = time.perf_counter()
+        store.compact(store.life[:n] > 0)
+        swap_remove = time.perf_counter() - started
+        print(f"compaction: {n} particles, list.remove {list_remove * 1000:.2f} ms, "
+              f"swap-remove {swap_remove * 1000:.3f} ms")
+
+def run_benchmarks():
+    # Same bursts on every run unless --seed asks for others
+    seed_fireworks(0 if fireworks_seed is None else fireworks_seed)
+    for bench in (bench_particle_step, bench_brocade_frames, bench_compaction,
+                  bench_renderers, bench_alpha, bench_render_scale, bench_analytic, bench_workers,
+                  bench_explosions):
+        bench()
+
+if options.benchmark:
+    run_benchmarks()
+    pygame.quit()
+    sys.exit()
+
+# === Self-Checks ===
+# Run with: python lap-timer23.py --check
+def simulate_celebration(seconds, fps, seed=1234, record=None):
+    # Finish-screen fireworks for a number of seconds at a given frame rate,
+    # with the governor held at full detail so it can't change the outcome.
+    # record, if given, is called with every frame drawn.
+    seed_fireworks(seed)
+    governor_state = governor.enabled, governor.level
+    governor.enabled, governor.level = False, 0
+    reset_fireworks()
+    for firework_type in ['brocade', 'star', 'palm', 'willow']:
+        add_firework(firework_type)
+    surface = pygame.Surface((screen_width, screen_height)).convert()
+    for frame in range(seconds * fps + 1):
+        update_fireworks(frame / fps)
+        surface.fill((0, 0, 0))
+        draw_fireworks(surface)
+        if record is not None:
+            record(surface)
+    governor.enabled, governor.level = governor_state
+
+def celebration_state():
+    # Particle arrays and rockets, to compare two simulations exactly
+    n = particle_store.count
+    return ([array[:n].copy() for array in (particle_store.x, particle_store.y, particle_store.vx,
+                                            particle_store.vy, particle_store.life)],
+            [(firework.x, firework.y, firework.exploded) for firework in fireworks])
+
+def same_state(state, other):
+    (arrays, rockets), (other_arrays, other_rockets) = state, other
+    return other_rockets == rockets and len(other_arrays[0]) == len(arrays[0]) and all(
+        np.array_equal(a, b) for a, b in zip(arrays, other_arrays))
+
+def check_fixed_timestep(seconds=10):
+    # The same seconds of celebration drawn at different frame rates must
+    # leave the simulation in exactly the same state
+    states = {}
+    for fps in (15, 30, 60):
+        simulate_celebration(seconds, fps)
+        states[fps] = celebration_state()
+    reset_fireworks()
+    arrays = states[30][0]
+    for fps, other in states.items():
+        if not same_state(states[30], other):
+            print(f"fixed timestep: FAILED, {fps} fps differs from 30 fps after {seconds} s")
+            return False
+    print(f"fixed timestep: ok, 15/30/60 fps agree on {len(arrays[0])} particles "
+          f"after {seconds} s")
+    return True
+
+def check_analytic(steps=90):
+    # Closed-form trajectories must land where step-by-step integration does
+    burst = brocade_burst()
+    integrated = store_from(burst)
+    analytic = store_from(burst)
+    analytic.analytic[:analytic.count] = True
+    for _ in range(steps):
+        integrated.step()
+        analytic.step()
+    analytic.evaluate()
+    n = integrated.count
+    error = max(np.abs(analytic.x[:n] - integrated.x[:n]).max(),
+                np.abs(analytic.y[:n] - integrated.y[:n]).max())
+    passed = error < 0.05
+    print(f"analytic trajectories: {'ok' if passed else 'FAILED'}, largest drift "
+          f"{error:.4f} px after {steps} steps")
+    return passed
+
+def check_seed(seconds=5):
+    # A seed must replay the same celebration, and a different seed must not
+    states = []
+    for seed in (1234, 1234, 4321):
+        simulate_celebration(seconds, target_fps, seed)
+        states.append(celebration_state())
+    reset_fireworks()
+    passed = same_state(states[0], states[1]) and not same_state(states[0], states[2])
+    print(f"seeded celebration: {'ok' if passed else 'FAILED'}, seed 1234 "
+          f"{'repeats' if same_state(states[0], states[1]) else 'does not repeat'} "
+          f"after {seconds} s")
+    return passed
+
+def visible_circles(store):
+    # The circles of a store that touch the screen, in a canonical order
+    x, y, radius, color = store.circles()
+    shown = ((x + radius >= 0) & (x - radius < screen_width) &
+             (y + radius >= 0) & (y - radius < screen_height))
+    circles = np.column_stack((x, y, radius, color))[shown]
+    return circles[np.lexsort(circles.T[::-1])]
+
+def check_culling(steps=240):
+    # Retiring off-screen particles early must not change a single drawn circle
+    burst = brocade_burst()
+    passed = True
+    for analytic in (False, True):
+        kept = store_from(burst)
+        culled = store_from(burst)
+        culled.bounds = (screen_width, screen_height)
+        kept.analytic[:kept.count] = culled.analytic[:culled.count] = analytic
+        for _ in range(steps):
+            kept.step()
+            culled.step()
+            if not np.array_equal(visible_circles(kept), visible_circles(culled)):
+                passed = False
+    print(f"off-screen culling: {'ok' if passed else 'FAILED'}, retired {culled.culled} of "
+          f"{len(burst)} particles, saving {culled.frames_saved} particle-frames")
+    return passed
+
+def check_snapshots(seconds=1.0):
+    # The renderer must never see a torn snapshot. A writer thread publishes
+    # frames of varying size with every value set to the frame's sequence
+    # number, and the reader checks each frame it holds is whole and newer.
+    snapshots = SnapshotBuffer()
+    finished = threading.Event()
+
+    def write():
+        sequence = 0
+        while not finished.is_set():
+            sequence += 1
+            frame = snapshots.back_frame()
+            frame.steps = sequence
+            n = 100 + sequence % 400
+            column = np.full(n, sequence, dtype=np.int32)
+            frame.store("circles", (column, column, column,
+                                    np.full((n, 3), sequence % 256, dtype=np.uint8)))
+            snapshots.publish()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    reads = torn = last = 0
+    ends = time.perf_counter() + seconds
+    while time.perf_counter() < ends:
+        frame = snapshots.acquire()
+        if frame is not None:
+            reads += 1
+            sequence = frame.steps
+            x, y, radius, color = frame.circles
+            if (sequence < last or len(x) != 100 + sequence % 400 or
+                    not all((array == sequence).all() for array in (x, y, radius)) or
+                    not (color == sequence % 256).all() or frame.steps != sequence):
+                torn += 1
+            last = sequence
+        snapshots.release()
+    finished.set()
+    writer.join()
+    passed = torn == 0 and reads > 0
+    print(f"snapshots: {'ok' if passed else 'FAILED'}, {torn} torn of {reads} frames read "
+          f"while {snapshots.published} were published")
+    return passed
+
+def run_checks():
+    results = [check() for check in (check_fixed_timestep, check_analytic, check_seed,
+                                     check_culling, check_snapshots)]
+    return all(results)
+
+if options.check:
+    passed = run_checks()
+    pygame.quit()
+    sys.exit(0 if passed else 1)
+
+# === Celebration Cache ===
+# Run with: python lap-timer23.py --bake
+if options.bake:
+    started_bake = time.perf_counter()
+    cache = CelebrationCache(celebration_key(), (screen_width, screen_height), target_fps)
+    simulate_celebration(celebration_seconds, target_fps, record=cache.record)
+    reset_fireworks()
+    cache.save(celebration_cache_path)
+    print(f"baked {len(cache.blobs)} frames in {time.perf_counter() - started_bake:.1f} s, "
+          f"{os.path.getsize(celebration_cache_path) / 1e6:.1f} MB at {celebration_cache_path}")
+    pygame.quit()
+    sys.exit()
+
+celebration_cache = load_celebration(celebration_cache_path, celebration_key())
+
 # === Main Loop ===
 while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
+    # Sleep until input or the next second or flash boundary, except during
+    # the celebration, which runs at the frame rate
+    events = pygame.event.get()
+    timeout = redraw_timeout()
+    if not events and timeout is not None:
+        events = [pygame.event.wait(timeout)] + pygame.event.get()
+
+    for event in events:
+        if event.type == GPIO_PRESS:
+            handle_gpio_press()
+
+        elif event.type == pygame.QUIT:
             pygame.quit()
             sys.exit()
 
@@ -649,5 +2412,33 @@ while True:
     if started and not paused and not done:
         elapsed_time = time.time() - start_time
 
-    draw_display(elapsed_time, remaining_laps, done)
-    clock.tick(30)
+    view = view_model(elapsed_time, remaining_laps, done)
+    if done or view != shown_view:
+        draw_display(elapsed_time, remaining_laps, done)
+        shown_view = view
+    else:
+        display_skips += 1
+
+    if done:
+        clock.tick(target_fps)
+        if governor.record(clock.get_rawtime()):
+            if fireworks_worker.running:
+                fireworks_worker.trail_cap = governor.trail_cap
+            else:
+                particle_store.cap_trails(governor.trail_cap)
+            if fireworks_auto_scale and governor.render_scale != fireworks_scale:
+                # The simulation thread captures at the store's scale, so it
+                # is stopped while the scale and the layers change
+                running = fireworks_worker.running
+                fireworks_worker.stop()
+                set_fireworks_scale(governor.render_scale)
+                if running:
+                    fireworks_worker.start()
+    else:
+        # Keep the clock current so the governor's first celebration frame
+        # isn't measured from before the wait
+        clock.tick()
+
+    if show_stats and time.time() - last_stats_time >= 1:
+        print({**fireworks_stats(), **text_cache.stats(), **display_stats()})
+        last_stats_time = time.time()